@@ -1,12 +1,13 @@
 
-import pandas as pd
-import pypdf
 import sys
 import os
 
+# pandas and pypdf are imported per file type, so inspecting a PDF doesn't load pandas
+
 def analyze_excel(path):
     print(f"--- Analyzing Excel: {os.path.basename(path)} ---")
     try:
+        import pandas as pd
         xls = pd.ExcelFile(path)
         print("Sheet Names:", xls.sheet_names)
         for sheet in xls.sheet_names:
@@ -20,6 +21,7 @@ def analyze_excel(path):
 def analyze_pdf(path):
     print(f"--- Analyzing PDF: {os.path.basename(path)} ---")
     try:
+        import pypdf
         reader = pypdf.PdfReader(path)
         print(f"Pages: {len(reader.pages)}")
         # Extract text from first few pages to identify form type and key fields
@@ -31,13 +33,14 @@ def analyze_pdf(path):
         print(f"Error reading PDF: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: py analyze_docs.py <excel_path> <pdf_path>")
+    if len(sys.argv) < 2:
+        print("Usage: py analyze_docs.py <excel_or_pdf_path> [...]")
         sys.exit(1)
-    
-    excel_path = sys.argv[1]
-    pdf_path = sys.argv[2]
-    
-    analyze_excel(excel_path)
-    print("\n" + "="*50 + "\n")
-    analyze_pdf(pdf_path)
+
+    for i, path in enumerate(sys.argv[1:]):
+        if i:
+            print("\n" + "="*50 + "\n")
+        if path.lower().endswith('.pdf'):
+            analyze_pdf(path)
+        else:
+            analyze_excel(path)
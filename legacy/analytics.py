@@ -0,0 +1,183 @@
+import os
+import uuid
+import shutil
+import functools
+from flask import current_app, has_app_context
+
+# Columnar copy of the contributions and expenditures tables for analytical scans,
+# so heavy queries over all years don't compete with the public search page for
+# SQLite. insert_batches appends the rows each load inserted; the store can be
+# rebuilt from SQLite at any time with database.rebuild_analytics().
+#
+# Layout: <ANALYTICS_DIR>/<table>/year=<YYYY>/source_file=<name>/part-<uuid>-<n>.parquet
+# Filer and contributor/payee names are dictionary-encoded, which is what makes
+# group-bys over them cheap.
+#
+# pyarrow is imported on first use rather than with this module, so processes
+# that never touch the store (a web worker serving searches) don't pay for it.
+
+ANALYTICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics')
+
+# Column types by name; 'names' is a dictionary-encoded string
+TABLES = {
+    'contributions': {
+        'columns': [('id', 'int64'), ('filer_name', 'names'), ('contributor_name', 'names'),
+            ('contribution_amount', 'float64'), ('contribution_date', 'string'),
+            ('contribution_day', 'date32'), ('contribution_cents', 'int64')],
+        'entity': 'contributor_name',
+        'cents': 'contribution_cents',
+        'day': 'contribution_day',
+    },
+    'expenditures': {
+        'columns': [('id', 'int64'), ('filer_name', 'names'), ('payee_name', 'names'),
+            ('expenditure_amount', 'float64'), ('expenditure_date', 'string'), ('expenditure_description', 'string'),
+            ('expenditure_day', 'date32'), ('expenditure_cents', 'int64')],
+        'entity': 'payee_name',
+        'cents': 'expenditure_cents',
+        'day': 'expenditure_day',
+    },
+}
+
+@functools.cache
+def schema(table_name):
+    """The pyarrow schema of a table's Parquet files."""
+    import pyarrow as pa
+    types = {'int64': pa.int64(), 'float64': pa.float64(), 'string': pa.string(), 'date32': pa.date32(),
+        'names': pa.dictionary(pa.int32(), pa.string())}
+    return pa.schema([(name, types[type_name]) for name, type_name in TABLES[table_name]['columns']])
+
+@functools.cache
+def partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([('year', pa.int32()), ('source_file', pa.string())]), flavor='hive')
+
+# Columns analysts can group by; 'entity' is contributor_name or payee_name
+GROUP_COLUMNS = ('year', 'filer_name', 'entity', 'source_file')
+
+def analytics_dir():
+    """Root of the Parquet store (app.config['ANALYTICS_DIR']), or None if disabled."""
+    if has_app_context():
+        return current_app.config.get('ANALYTICS_DIR', ANALYTICS_DIR)
+    return ANALYTICS_DIR
+
+def append(table_name, rows):
+    """
+    Appends rows (dicts with the table's columns, including id and source_file)
+    to the Parquet dataset. Returns the number of rows written.
+    """
+    root = analytics_dir()
+    if not root or not rows:
+        return 0
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    spec = TABLES[table_name]
+    columns = {field.name: pa.array([row.get(field.name) for row in rows], type=field.type) for field in schema(table_name)}
+    columns['year'] = pc.year(columns[spec['day']]).cast(pa.int32())
+    columns['source_file'] = pa.array([row.get('source_file') for row in rows], type=pa.string())
+    ds.write_dataset(pa.table(columns), os.path.join(root, table_name), format='parquet', partitioning=partitioning(),
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet", existing_data_behavior='overwrite_or_ignore')
+    return len(rows)
+
+def clear(table_name=None):
+    """Deletes one table's dataset, or the whole store."""
+    root = analytics_dir()
+    if root:
+        shutil.rmtree(os.path.join(root, table_name) if table_name else root, ignore_errors=True)
+
+def exists(table_name):
+    root = analytics_dir()
+    return bool(root) and os.path.isdir(os.path.join(root, table_name))
+
+def dataset(table_name):
+    """Returns the pyarrow Dataset for a table, or None if nothing has been stored yet."""
+    if not exists(table_name):
+        return None
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    full_schema = pa.unify_schemas([schema(table_name), partitioning().schema])
+    return ds.dataset(os.path.join(analytics_dir(), table_name), schema=full_schema, format='parquet', partitioning=partitioning())
+
+def _filter(table_name, filer_name=None, entity_name=None, min_amount=None, max_amount=None,
+        start_year=None, end_year=None, source_file=None):
+    """Builds a dataset filter expression. Year and source file filters prune whole partitions."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    spec = TABLES[table_name]
+    conditions = []
+    if filer_name:
+        conditions.append(pc.match_substring(pc.field('filer_name').cast(pa.string()), filer_name, ignore_case=True))
+    if entity_name:
+        conditions.append(pc.match_substring(pc.field(spec['entity']).cast(pa.string()), entity_name, ignore_case=True))
+    if min_amount is not None:
+        conditions.append(pc.field(spec['cents']) >= round(float(min_amount) * 100))
+    if max_amount is not None:
+        conditions.append(pc.field(spec['cents']) <= round(float(max_amount) * 100))
+    if start_year is not None:
+        conditions.append(pc.field('year') >= int(start_year))
+    if end_year is not None:
+        conditions.append(pc.field('year') <= int(end_year))
+    if source_file:
+        conditions.append(pc.field('source_file') == source_file)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def scan(table_name, columns=None, limit=None, **filters):
+    """
+    Returns the matching rows as a pyarrow Table (call .to_pandas() for a DataFrame).
+
+    Args:
+        table_name (str): 'contributions' or 'expenditures'.
+        columns (list): Columns to read; all of them by default.
+        limit (int): Maximum rows to return.
+        **filters: filer_name / entity_name (case-insensitive substrings),
+            min_amount, max_amount, start_year, end_year, source_file.
+    """
+    data = dataset(table_name)
+    if data is None:
+        import pyarrow as pa
+        empty = pa.unify_schemas([schema(table_name), partitioning().schema]).empty_table()
+        return empty.select(columns) if columns else empty
+    expression = _filter(table_name, **filters)
+    if limit is not None:
+        return data.head(limit, columns=columns, filter=expression)
+    return data.to_table(columns=columns, filter=expression)
+
+def aggregate(table_name, group_by=('filer_name',), limit=None, **filters):
+    """
+    Sums, counts and averages amounts per group over the matching rows, largest
+    totals first.
+
+    Args:
+        table_name (str): 'contributions' or 'expenditures'.
+        group_by (list): Any of GROUP_COLUMNS; empty for a single grand total.
+        limit (int): Maximum groups to return.
+        **filters: As for scan().
+
+    Returns:
+        list: One dict per group with the group columns plus total, count, average,
+        min and max.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    spec = TABLES[table_name]
+    keys = [spec['entity'] if column == 'entity' else column for column in group_by]
+    unknown = set(group_by) - set(GROUP_COLUMNS)
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(sorted(unknown))}")
+    cents = spec['cents']
+    # Each Parquet file has its own dictionaries; unified, keys group on their integer indices
+    table = scan(table_name, columns=keys + [cents], **filters).unify_dictionaries()
+    grouped = table.group_by(keys).aggregate([(cents, 'sum'), (cents, 'count'), (cents, 'mean'), (cents, 'min'), (cents, 'max')])
+    grouped = grouped.rename_columns({f'{cents}_sum': 'total', f'{cents}_count': 'count', f'{cents}_mean': 'average',
+        f'{cents}_min': 'min', f'{cents}_max': 'max'})
+    grouped = grouped.sort_by([('total', 'descending')])
+    if limit is not None:
+        grouped = grouped.slice(0, limit)
+    # Sums run over integer cents, so totals are exact until this conversion
+    for name in ('total', 'average', 'min', 'max'):
+        grouped = grouped.set_column(grouped.schema.get_field_index(name), name, pc.divide(grouped[name].cast(pa.float64()), 100.0))
+    return [{'entity' if name == spec['entity'] else name: value for name, value in row.items()} for row in grouped.to_pylist()]
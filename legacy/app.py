@@ -1,27 +1,77 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, jsonify, Response, stream_with_context, g
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from sqlalchemy import text
 import os
+import io
+import csv
+import json
+import base64
+import uuid
+import time
+import datetime
 import logging
+import contextlib
 from logging.handlers import RotatingFileHandler
 
-from data_extractor import process_uploaded_file
-from database import create_database, insert_data, ENGINE
+from database import create_database, filer_totals, top_entities, is_ingested, data_generation, READ_ENGINE, POSTGRESQL
+from query_cache import QueryCache
+from upload_store import save_upload, link_upload
+import metrics
+import analytics
+import normalize
+from jobs import create_jobs_database, enqueue_job, get_job, start_workers
 
 # --- App Setup ---
 app = Flask(__name__)
 # IMPORTANT: Change this secret key for production
 app.config['SECRET_KEY'] = 'a-very-secret-key' 
 app.config['UPLOAD_FOLDER'] = os.path.join(os.getenv('TEMP'), 'VoterVantageUploads')
+# Rows per batch when streaming uploads into the database; bounds upload memory
+app.config['INGEST_BATCH_SIZE'] = 5000
+# Rows per executemany() call when bulk loading into the database
+app.config['INSERT_BATCH_SIZE'] = 1000
+# Background ingestion worker threads; each processes one uploaded file at a time
+app.config['INGEST_WORKERS'] = 4
+# Bulk ingestion (batch_ingest.py): extraction processes (None = one per CPU), and the
+# PDF size from which a file runs alone with every process OCR'ing its pages
+app.config['BATCH_INGEST_WORKERS'] = None
+app.config['BATCH_INGEST_LARGE_PDF_MB'] = 20
+# Search page: rows per page (overridable with ?page_size= up to the max) and the
+# point past which match counts are reported as "N+" instead of counted exactly
+app.config['SEARCH_PAGE_SIZE'] = 100
+app.config['SEARCH_MAX_PAGE_SIZE'] = 1000
+app.config['SEARCH_COUNT_LIMIT'] = 10000
+# Search result cache: pages kept (0 disables it) and seconds each may be served for.
+# Entries are also invalidated whenever a load commits new rows.
+app.config['SEARCH_CACHE_SIZE'] = 256
+app.config['SEARCH_CACHE_TTL'] = 300
+# Rows fetched from the DB per chunk when streaming an export
+app.config['EXPORT_CHUNK_SIZE'] = 1000
+# PDF OCR: worker processes (None = one per CPU) and per-page text cache (None disables it)
+app.config['OCR_WORKERS'] = None
+app.config['OCR_CACHE_DIR'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_cache')
+# Uploads are stored once per content hash; identical re-uploads are skipped
+app.config['UPLOAD_STORE_DIR'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload_store')
+# Per-sheet XLSX extraction cache, so amended workbooks only re-extract changed sheets (None disables it)
+app.config['SHEET_CACHE_DIR'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sheet_cache')
+# Optional schedule sheets to extract as well, e.g. ['497'] for late contributions (see schedules.py)
+app.config['EXTRA_SCHEDULES'] = []
+# Log level; DEBUG adds per-row and per-page extraction logging, which is costly on large files
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO')
+# Fraction of requests and ingestion jobs to profile with cProfile (0 disables); .prof files go to PROFILE_DIR
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+app.config['PROFILE_DIR'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+# Parquet copy of the loaded rows for analytical queries (see analytics.py; None disables it)
+app.config['ANALYTICS_DIR'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics')
 
 # --- Logging Setup ---
 log_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'application.log')
-handler = RotatingFileHandler(log_file_path, maxBytes=10000, backupCount=1)
+handler = RotatingFileHandler(log_file_path, maxBytes=10 * 1024 * 1024, backupCount=1)
 handler.setLevel(logging.DEBUG)
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 app.logger.addHandler(handler)
-app.logger.setLevel(logging.DEBUG)
+app.logger.setLevel(app.config['LOG_LEVEL'])
 
 # --- Login Manager Setup ---
 login_manager = LoginManager()
@@ -47,53 +97,295 @@ def load_user(user_id):
         return admin_user
     return None
 
-# --- Routes ---
-@app.route('/')
-def index():
-    app.logger.debug("Accessing public index page.")
-    filer_name = request.args.get('filer_name')
-    entity_name = request.args.get('entity_name')
-    min_amount = request.args.get('min_amount')
-    max_amount = request.args.get('max_amount')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+# --- Search Helpers ---
+search_cache = QueryCache('search', app.config['SEARCH_CACHE_SIZE'], app.config['SEARCH_CACHE_TTL'])
+
+# Typed date columns the search page filters and orders by
+DATE_COLUMNS = {'contributions': 'contribution_day', 'expenditures': 'expenditure_day'}
+# Undated rows sort last; that is already SQLite's order for DESC, but not PostgreSQL's
+NULLS_LAST = ' NULLS LAST' if POSTGRESQL else ''
+
+def parse_day(value):
+    """Parses a date filter in any format normalize.py accepts to 'YYYY-MM-DD', or None."""
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value.strip()).isoformat() # What date inputs submit
+    except ValueError:
+        return normalize.to_iso(normalize.parse_dates([value]))[0]
+
+def build_search_queries(args):
+    """
+    Builds the filtered contributions/expenditures queries for the search page and
+    the export endpoint from the request arguments.
+
+    Returns:
+        tuple: (contributions_query, expenditures_query, params)
+    """
+    filer_name = (args.get('filer_name') or '').strip()
+    entity_name = (args.get('entity_name') or '').strip()
+    min_amount = args.get('min_amount')
+    max_amount = args.get('max_amount')
+    start_day = parse_day(args.get('start_date'))
+    end_day = parse_day(args.get('end_date'))
 
     contributions_query = "SELECT * FROM contributions WHERE 1=1"
     expenditures_query = "SELECT * FROM expenditures WHERE 1=1"
 
     params = {}
 
+    # Name filters are answered by the trigram indexes instead of scanning the tables:
+    # SQLite's FTS5 tables, or pg_trgm indexes on the columns themselves on PostgreSQL
+    like = 'ILIKE' if POSTGRESQL else 'LIKE'
+    contributions_fts = []
+    expenditures_fts = []
     if filer_name:
-        contributions_query += " AND filer_name LIKE :filer_name"
-        expenditures_query += " AND filer_name LIKE :filer_name"
+        contributions_fts.append(f"filer_name {like} :filer_name")
+        expenditures_fts.append(f"filer_name {like} :filer_name")
         params['filer_name'] = f'%{filer_name}%'
     if entity_name:
-        contributions_query += " AND contributor_name LIKE :entity_name"
-        expenditures_query += " AND payee_name LIKE :entity_name"
+        contributions_fts.append(f"contributor_name {like} :entity_name")
+        expenditures_fts.append(f"payee_name {like} :entity_name")
         params['entity_name'] = f'%{entity_name}%'
+    if contributions_fts and POSTGRESQL:
+        contributions_query += f" AND {' AND '.join(contributions_fts)}"
+        expenditures_query += f" AND {' AND '.join(expenditures_fts)}"
+    elif contributions_fts:
+        contributions_query += f" AND id IN (SELECT rowid FROM contributions_fts WHERE {' AND '.join(contributions_fts)})"
+        expenditures_query += f" AND id IN (SELECT rowid FROM expenditures_fts WHERE {' AND '.join(expenditures_fts)})"
+    # Amounts and dates compare as integer cents and ISO days, so the range indexes apply
     if min_amount:
-        contributions_query += " AND contribution_amount >= :min_amount"
-        expenditures_query += " AND expenditure_amount >= :min_amount"
-        params['min_amount'] = float(min_amount)
+        contributions_query += " AND contribution_cents >= :min_cents"
+        expenditures_query += " AND expenditure_cents >= :min_cents"
+        params['min_cents'] = round(float(min_amount) * 100)
     if max_amount:
-        contributions_query += " AND contribution_amount <= :max_amount"
-        expenditures_query += " AND expenditure_amount <= :max_amount"
-        params['max_amount'] = float(max_amount)
-    if start_date:
-        contributions_query += " AND contribution_date >= :start_date"
-        expenditures_query += " AND expenditure_date >= :start_date"
-        params['start_date'] = start_date
-    if end_date:
-        contributions_query += " AND contribution_date <= :end_date"
-        expenditures_query += " AND expenditure_date <= :end_date"
-        params['end_date'] = end_date
-
-    with ENGINE.connect() as connection:
-        contributions = connection.execute(text(contributions_query), params).fetchall()
-        expenditures = connection.execute(text(expenditures_query), params).fetchall()
+        contributions_query += " AND contribution_cents <= :max_cents"
+        expenditures_query += " AND expenditure_cents <= :max_cents"
+        params['max_cents'] = round(float(max_amount) * 100)
+    if start_day:
+        contributions_query += " AND contribution_day >= :start_day"
+        expenditures_query += " AND expenditure_day >= :start_day"
+        params['start_day'] = start_day
+    if end_day:
+        contributions_query += " AND contribution_day <= :end_day"
+        expenditures_query += " AND expenditure_day <= :end_day"
+        params['end_day'] = end_day
+
+    return contributions_query, expenditures_query, params
+
+def encode_cursor(row_date, row_id):
+    """Encodes the (date, id) of the last row on a page as an opaque URL-safe cursor."""
+    row_date = str(row_date) if row_date is not None else None # PostgreSQL returns date objects
+    return base64.urlsafe_b64encode(json.dumps([row_date, row_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decodes a cursor from encode_cursor, or returns None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        row_date, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return row_date, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def fetch_page(connection, table, query, params, cursor, page_size):
+    """
+    Fetches one page of a search query, newest first, using keyset pagination on
+    (date, id) so every page costs the same no matter how deep it is. Rows with no
+    date sort last.
+
+    Returns:
+        tuple: (rows, cursor for the next page or None)
+    """
+    date_column = DATE_COLUMNS[table]
+    params = dict(params, page_limit=page_size + 1)
+    after = decode_cursor(cursor)
+    if after:
+        params['after_date'], params['after_id'] = after
+        if after[0] is None:
+            query += f" AND {date_column} IS NULL AND id < :after_id"
+        else:
+            query += f" AND (({date_column}, id) < (:after_date, :after_id) OR {date_column} IS NULL)"
+    query += f" ORDER BY {date_column} DESC{NULLS_LAST}, id DESC LIMIT :page_limit"
+
+    rows = connection.execute(text(query), params).fetchall()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]._mapping
+    return rows, encode_cursor(last[date_column], last['id'])
+
+def estimate_count(connection, query, params, limit):
+    """
+    Counts the rows matching a search query, stopping at `limit` so the count
+    stays cheap on large tables.
+
+    Returns:
+        tuple: (count, True if the count is exact or False if there are more rows)
+    """
+    count = connection.execute(text(f"SELECT count(*) FROM ({query} LIMIT :count_limit) AS matches"), dict(params, count_limit=limit + 1)).scalar()
+    return min(count, limit), count <= limit
+
+# --- Instrumentation ---
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_profile = contextlib.ExitStack()
+    g.request_profile.enter_context(metrics.profiled(f"request:{request.endpoint}"))
+
+@app.teardown_request
+def stop_request_timer(exc):
+    if 'request_start' not in g:
+        return
+    g.request_profile.close()
+    metrics.observe('http_request_seconds', time.perf_counter() - g.request_start, endpoint=request.endpoint or 'unknown')
+
+# --- Routes ---
+@app.route('/')
+def index():
+    app.logger.debug("Accessing public index page.")
+    return render_template('index.html', **search_page(request.args))
+
+def search_cache_key(generation, params, page_size, args):
+    """
+    Keys a search page on the data generation and the normalized filters (cents,
+    ISO days and trimmed names, as build_search_queries produced them). The name
+    filters ignore ASCII case, so 'smith' and 'Smith' share an entry.
+    """
+    filters = tuple(sorted(
+        (name, value.lower() if isinstance(value, str) and value.isascii() else value)
+        for name, value in params.items()
+    ))
+    return (generation, filters, page_size, args.get('contributions_after'), args.get('expenditures_after'))
+
+def search_page(args):
+    """
+    Runs the public search for the request arguments: one keyset page of matching
+    contributions and expenditures, plus the pagination state for the template.
+    Pages are served from search_cache until new data is loaded or they expire.
+    """
+    contributions_query, expenditures_query, params = build_search_queries(args)
+    page_size = min(args.get('page_size', app.config['SEARCH_PAGE_SIZE'], type=int), app.config['SEARCH_MAX_PAGE_SIZE'])
+    page_size = max(page_size, 1)
+    count_limit = app.config['SEARCH_COUNT_LIMIT']
+
+    with READ_ENGINE.connect() as connection:
+        key = search_cache_key(data_generation(connection), params, page_size, args)
+        cached = search_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+        with metrics.timed('query', source='contributions_page'):
+            contributions, contributions_next = fetch_page(connection, 'contributions', contributions_query, params, args.get('contributions_after'), page_size)
+        with metrics.timed('query', source='expenditures_page'):
+            expenditures, expenditures_next = fetch_page(connection, 'expenditures', expenditures_query, params, args.get('expenditures_after'), page_size)
+        with metrics.timed('query', source='contributions_count'):
+            contributions_total = estimate_count(connection, contributions_query, params, count_limit)
+        with metrics.timed('query', source='expenditures_count'):
+            expenditures_total = estimate_count(connection, expenditures_query, params, count_limit)
     app.logger.debug(f"Fetched {len(contributions)} contributions from DB.")
     app.logger.debug(f"Fetched {len(expenditures)} expenditures from DB.")
-    return render_template('index.html', contributions=contributions, expenditures=expenditures)
+    pagination = {
+        'page_size': page_size,
+        'contributions_next': contributions_next,
+        'expenditures_next': expenditures_next,
+        'contributions_total': contributions_total[0],
+        'contributions_total_exact': contributions_total[1],
+        'expenditures_total': expenditures_total[0],
+        'expenditures_total_exact': expenditures_total[1],
+    }
+    page = {'contributions': contributions, 'expenditures': expenditures, 'pagination': pagination}
+    search_cache.put(key, page)
+    return dict(page)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage timings and counters in the Prometheus text format, for scraping."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/cache')
+def cache_stats():
+    """Search result cache hits, misses, evictions and size for this worker, as JSON."""
+    return jsonify(search_cache.stats())
+
+@app.route('/export/<table>.<fmt>')
+def export(table, fmt):
+    """
+    Streams every contribution or expenditure matching the search filters as CSV
+    or NDJSON. Rows are written out as they are read, so memory stays bounded.
+    """
+    if table not in DATE_COLUMNS or fmt not in ('csv', 'ndjson'):
+        abort(404)
+    contributions_query, expenditures_query, params = build_search_queries(request.args)
+    query = contributions_query if table == 'contributions' else expenditures_query
+    query += f" ORDER BY {DATE_COLUMNS[table]} DESC{NULLS_LAST}, id DESC"
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    app.logger.debug(f"Exporting {table} as {fmt}.")
+
+    def generate():
+        with READ_ENGINE.connect() as connection:
+            result = connection.execution_options(yield_per=chunk_size).execute(text(query), params)
+            columns = list(result.keys())
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if fmt == 'csv':
+                writer.writerow(columns)
+            for rows in result.partitions():
+                if fmt == 'csv':
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(zip(columns, row)), default=str) + "\n")
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={table}.{fmt}'
+    return response
+
+@app.route('/summary/filers')
+def summary_filers():
+    """
+    Contribution or expenditure totals per filer (?kind=, default contributions),
+    served from the rollup tables. ?by=period breaks them down per month and
+    ?filer_name= narrows the filers.
+    """
+    kind = request.args.get('kind', 'contributions')
+    if kind not in DATE_COLUMNS:
+        abort(404)
+    return jsonify(filer_totals(kind, request.args.get('filer_name'), by_period=request.args.get('by') == 'period'))
+
+@app.route('/summary/top/<kind>')
+def summary_top(kind):
+    """Top contributors or payees by total amount (?limit=, default 10), served from the rollup tables."""
+    entity_kinds = {'contributors': 'contributor', 'payees': 'payee'}
+    if kind not in entity_kinds:
+        abort(404)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), app.config['SEARCH_MAX_PAGE_SIZE'])
+    return jsonify(top_entities(entity_kinds[kind], limit))
+
+@app.route('/analytics/<table>')
+def analytics_query(table):
+    """
+    Aggregates contributions or expenditures from the Parquet store without
+    touching the database. ?group_by= takes a comma-separated list of year,
+    filer_name, entity and source_file (default filer_name; empty for a grand
+    total). Filters: filer_name, entity_name, min_amount, max_amount, start_year,
+    end_year and source_file. ?limit= caps the groups returned.
+    """
+    if table not in analytics.TABLES or not app.config['ANALYTICS_DIR']:
+        abort(404)
+    group_by = [column for column in request.args.get('group_by', 'filer_name').split(',') if column]
+    if set(group_by) - set(analytics.GROUP_COLUMNS):
+        abort(400)
+    filters = {name: request.args.get(name) for name in ('filer_name', 'entity_name', 'source_file')}
+    filters.update({name: request.args.get(name, type=float) for name in ('min_amount', 'max_amount')})
+    filters.update({name: request.args.get(name, type=int) for name in ('start_year', 'end_year')})
+    limit = min(max(request.args.get('limit', 100, type=int), 1), app.config['SEARCH_MAX_PAGE_SIZE'])
+    return jsonify(analytics.aggregate(table, group_by, limit=limit, **filters))
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -139,6 +431,10 @@ def upload_files():
     files = request.files.getlist('files[]')
     app.logger.debug(f"Files received: {len(files)}")
     
+    # Each upload gets its own directory so concurrent uploads of the same filename
+    # don't overwrite each other before the workers get to them
+    upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], uuid.uuid4().hex)
+    saved_files = []
     for file in files:
         app.logger.debug(f"Processing file: {file.filename}")
         if file.filename == '':
@@ -146,22 +442,36 @@ def upload_files():
             continue
         if file:
             filename = file.filename
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            app.logger.debug(f"Saving file to: {file_path}")
-            file.save(file_path)
-            app.logger.debug(f"Calling process_uploaded_file for: {file_path}")
-            data = process_uploaded_file(file_path)
-            app.logger.debug(f"Data returned from process_uploaded_file: {data}")
-            if data:
-                app.logger.info(f"Successfully processed {filename}")
-                insert_data(data)
-                flash(f'Successfully processed {filename}')
-            else:
-                flash(f'Failed to process {filename}: No data extracted.')
-                flash(f'Failed to process {filename}')
+            if os.path.splitext(filename)[1].lower() not in ('.xlsx', '.pdf'):
+                app.logger.warning(f"Unsupported file type: {filename}")
+                flash(f'Failed to process {filename}: Unsupported file type.')
+                continue
+            file_hash, blob = save_upload(file, app.config['UPLOAD_STORE_DIR'])
+            if is_ingested(file_hash) or file_hash in {saved[2] for saved in saved_files}:
+                app.logger.info(f"Skipping {filename}: identical content already ingested (sha256 {file_hash}).")
+                flash(f'Skipped {filename}: this file has already been uploaded.')
+                continue
+            file_path = link_upload(blob, upload_dir, filename)
+            app.logger.debug(f"Saved file to: {file_path} (sha256 {file_hash})")
+            saved_files.append((filename, file_path, file_hash))
+
+    if saved_files:
+        start_workers(app)
+        job_id = enqueue_job(saved_files)
+        app.logger.info(f"Queued ingestion job {job_id} for {len(saved_files)} file(s).")
+        flash(f'Queued {len(saved_files)} file(s) for processing. Track progress at {url_for("job_status", job_id=job_id)}')
 
     return redirect(url_for('admin'))
 
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Returns an ingestion job's status with per-file progress and timings."""
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
 # --- Main Execution ---
 if __name__ == '__main__':
     try:
@@ -170,6 +480,8 @@ if __name__ == '__main__':
             os.makedirs(app.config['UPLOAD_FOLDER'])
             app.logger.info(f"Created UPLOAD_FOLDER: {app.config['UPLOAD_FOLDER']}")
         create_database()
+        create_jobs_database()
+        start_workers(app)
         app.run(debug=False, use_reloader=False)
     except Exception as e:
         app.logger.critical(f"Application crashed: {e}", exc_info=True)
\ No newline at end of file
@@ -0,0 +1,231 @@
+"""
+Parallel ingestion of many filings at once, e.g. a whole election cycle.
+
+Usage (from the legacy/ directory):
+    python batch_ingest.py FILE_OR_DIRECTORY [...] [--workers N] [--large-pdf-mb MB]
+
+Files are extracted across a pool of worker processes, since XLSX parsing and
+OCR are CPU-bound and independent per file. Each worker spools its file's
+record batches to disk, and a single writer thread loads finished spools one
+file (one transaction) at a time. SQLite never sees competing writers, and the
+workers keep extracting while a load is in progress.
+
+Scheduling is memory-aware: PDFs of app.config['BATCH_INGEST_LARGE_PDF_MB'] or
+more (scans, whose pages are rendered at OCR_DPI) run alone, with all the
+workers OCR'ing their pages. Other files run up to `workers` at a time, largest
+first.
+"""
+import argparse
+import collections
+import concurrent.futures
+import glob
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from flask import Flask, current_app
+
+from data_extractor import stream_uploaded_file
+from database import insert_batches, is_ingested
+from spool import write_spool, read_spool
+from upload_store import file_sha256
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.pdf')
+
+# Settings the extractors read from current_app, copied into each worker's app
+WORKER_CONFIG_KEYS = ('INGEST_BATCH_SIZE', 'OCR_CACHE_DIR', 'SHEET_CACHE_DIR', 'EXTRA_SCHEDULES', 'LOG_LEVEL')
+
+_worker_context = None
+
+def _init_worker(config):
+    """Gives each worker process a minimal app, so the extractors can use current_app."""
+    global _worker_context
+    os.environ['OMP_THREAD_LIMIT'] = '1' # Parallelism comes from the pool, not tesseract threads
+    worker_app = Flask('batch_ingest')
+    worker_app.config.update(config)
+    worker_app.logger.setLevel(config.get('LOG_LEVEL') or 'INFO')
+    _worker_context = worker_app.app_context()
+    _worker_context.push()
+
+def _extract_to_spool(file_path, spool_path, ocr_workers):
+    """
+    Runs in a worker: extracts one file, pickling each record batch to spool_path
+    as it is produced. Returns (rows extracted, seconds, per-page report), where
+    the report is empty for workbooks.
+    """
+    start = time.perf_counter()
+    current_app.config['OCR_WORKERS'] = ocr_workers
+    page_report = []
+    batches = stream_uploaded_file(file_path, current_app.config['INGEST_BATCH_SIZE'], report=page_report)
+    rows = write_spool(batches or [], spool_path)
+    return rows, time.perf_counter() - start, page_report
+
+def describe_pages(page_report):
+    """Summarizes a per-page report, e.g. '12 text, 3 ocr, 1 failed (page 7)'."""
+    methods = collections.Counter(entry['method'] for entry in page_report)
+    summary = ', '.join(f"{count} {method}" for method, count in methods.items())
+    failed = [str(entry['page']) for entry in page_report if entry['method'] == 'failed']
+    if failed:
+        summary += f" (page{'s' if len(failed) > 1 else ''} {', '.join(failed)})"
+    return summary
+
+def collect_files(paths):
+    """Expands directories to the supported files in them, in a stable order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(found for found in glob.glob(os.path.join(path, '*'))
+                if os.path.splitext(found)[1].lower() in SUPPORTED_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+def ingest_files(app, paths, workers=None, large_pdf_mb=None, on_file=None):
+    """
+    Extracts and loads a set of files in parallel.
+
+    Args:
+        app: The Flask app whose config and database are used.
+        paths (list): Files or directories of files to ingest.
+        workers (int): Extraction processes (default app.config['BATCH_INGEST_WORKERS'],
+            or one per CPU).
+        large_pdf_mb (float): PDFs at least this large run alone (default
+            app.config['BATCH_INGEST_LARGE_PDF_MB']).
+        on_file (callable): Called with each file's result as it finishes.
+
+    Returns:
+        list: One dict per file with its status ('done', 'skipped' or 'failed'),
+        rows extracted, inserted and skipped, and extract/load seconds. PDFs
+        also have a page_report of how each page was read (see
+        data_extractor.stream_data_from_pdf). A PDF that yields no records
+        because OCR failed on its pages is 'failed'.
+    """
+    workers = workers or app.config.get('BATCH_INGEST_WORKERS') or os.cpu_count() or 1
+    large_pdf_mb = large_pdf_mb if large_pdf_mb is not None else app.config.get('BATCH_INGEST_LARGE_PDF_MB', 20)
+    results = []
+    results_lock = threading.Lock()
+
+    def finish(result):
+        with results_lock:
+            results.append(result)
+        if on_file:
+            on_file(result)
+
+    # Hash up front so identical content is skipped before any extraction work
+    regular, large, seen = [], [], set()
+    with app.app_context():
+        for path in collect_files(paths):
+            filename = os.path.basename(path)
+            if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+                finish({'file': filename, 'status': 'failed', 'error': 'Unsupported file type'})
+                continue
+            file_hash = file_sha256(path)
+            if file_hash in seen or is_ingested(file_hash):
+                finish({'file': filename, 'status': 'skipped', 'error': None})
+                continue
+            seen.add(file_hash)
+            size = os.path.getsize(path)
+            is_large = filename.lower().endswith('.pdf') and size >= large_pdf_mb * 1024 * 1024
+            (large if is_large else regular).append((size, path, file_hash))
+    regular.sort(reverse=True) # Largest first, so the long ones don't start last
+
+    spool_dir = tempfile.mkdtemp(prefix='batch_ingest_')
+    loads = queue.Queue()
+
+    def writer():
+        with app.app_context():
+            while True:
+                item = loads.get()
+                if item is None:
+                    return
+                path, file_hash, spool_path, rows, extract_seconds, page_report = item
+                filename = os.path.basename(path)
+                start = time.perf_counter()
+                try:
+                    stats = insert_batches(read_spool(spool_path), app.config['INSERT_BATCH_SIZE'],
+                        file_hash=file_hash, filename=filename)
+                    finish({'file': filename, 'status': 'done', 'error': None, 'rows_extracted': rows,
+                        'inserted': stats['contributions']['inserted'] + stats['expenditures']['inserted'],
+                        'skipped': stats['contributions']['skipped'] + stats['expenditures']['skipped'],
+                        'extract_seconds': extract_seconds, 'load_seconds': time.perf_counter() - start,
+                        'page_report': page_report or None})
+                except Exception as e:
+                    app.logger.error(f"Failed to load {filename}: {e}", exc_info=True)
+                    finish({'file': filename, 'status': 'failed', 'error': str(e)})
+                finally:
+                    os.remove(spool_path)
+
+    writer_thread = threading.Thread(target=writer, name='batch-ingest-writer', daemon=True)
+    writer_thread.start()
+    config = {key: app.config.get(key) for key in WORKER_CONFIG_KEYS}
+    in_flight = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as executor:
+            def submit(item, ocr_workers):
+                size, path, file_hash = item
+                spool_path = os.path.join(spool_dir, f"{file_hash}.pickle")
+                future = executor.submit(_extract_to_spool, path, spool_path, ocr_workers)
+                in_flight[future] = (path, file_hash, spool_path, ocr_workers > 1)
+
+            while regular or large or in_flight:
+                running_alone = any(alone for _, _, _, alone in in_flight.values())
+                if large and not in_flight:
+                    submit(large.pop(0), workers)
+                    continue
+                if regular and not running_alone and len(in_flight) < workers:
+                    submit(regular.pop(0), 1)
+                    continue
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    path, file_hash, spool_path, _ = in_flight.pop(future)
+                    try:
+                        rows, extract_seconds, page_report = future.result()
+                        failed_pages = [str(entry['page']) for entry in page_report if entry['method'] == 'failed']
+                        if failed_pages and not rows:
+                            raise ValueError(f"No records extracted; OCR failed on page(s) {', '.join(failed_pages)}")
+                    except Exception as e:
+                        app.logger.error(f"Failed to extract {path}: {e}", exc_info=True)
+                        finish({'file': os.path.basename(path), 'status': 'failed', 'error': str(e)})
+                        if os.path.exists(spool_path):
+                            os.remove(spool_path)
+                        continue
+                    loads.put((path, file_hash, spool_path, rows, extract_seconds, page_report))
+    finally:
+        loads.put(None)
+        writer_thread.join()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='XLSX/PDF files, or directories of them')
+    parser.add_argument('--workers', type=int, help='extraction processes (default: one per CPU)')
+    parser.add_argument('--large-pdf-mb', type=float, help='PDFs at least this large run alone')
+    args = parser.parse_args()
+
+    from app import app
+    from database import create_database
+    with app.app_context():
+        create_database()
+
+    def report(result):
+        if result['status'] == 'done':
+            print(f"{result['file']}: {result['rows_extracted']} rows extracted in {result['extract_seconds']:.1f}s, "
+                f"{result['inserted']} inserted ({result['skipped']} duplicates) in {result['load_seconds']:.1f}s")
+            if result['page_report']:
+                print(f"  pages: {describe_pages(result['page_report'])}")
+        else:
+            print(f"{result['file']}: {result['status']}{': ' + result['error'] if result['error'] else ''}")
+
+    start = time.perf_counter()
+    results = ingest_files(app, args.paths, args.workers, args.large_pdf_mb, on_file=report)
+    statuses = [result['status'] for result in results]
+    print(f"Ingested {statuses.count('done')} file(s), skipped {statuses.count('skipped')}, "
+        f"{statuses.count('failed')} failed in {time.perf_counter() - start:.1f}s.")
+    return 1 if 'failed' in statuses else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+"""
+Read latency while a bulk load is in progress.
+
+Usage (from the legacy/ directory):
+    python benchmarks/bench_concurrency.py [--rows 20000] [--readers 4] [--output FILE]
+
+Loads one synthetic workbook, then runs the index page's queries from --readers
+threads twice: once with the database idle, and once while a second workbook is
+bulk loaded by insert_data in another thread. The result cache is disabled, so
+every search reaches the database. Reads go through the read-only pool and the
+load through the single writer connection (engine.py); in WAL mode a read should
+never wait for the load's transaction, so latencies under load should stay close
+to idle ones and there should be no 'database is locked' errors.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+LEGACY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LEGACY_DIR)
+
+from bench_ingestion import QUERIES
+from harness import add_output_arguments, params, scratch_directory, fresh_database, write_result
+
+def latency_summary(latencies, errors, seconds):
+    ordered = sorted(latencies)
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else None
+    return {
+        'queries': len(ordered),
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'queries_per_sec': len(ordered) / seconds if seconds else None,
+        'p50_ms': percentile(0.50) * 1000 if ordered else None,
+        'p95_ms': percentile(0.95) * 1000 if ordered else None,
+        'max_ms': ordered[-1] * 1000 if ordered else None,
+        'mean_ms': statistics.fmean(ordered) * 1000 if ordered else None,
+    }
+
+def run_readers(app, readers, until):
+    """
+    Runs the index page queries round-robin from `readers` threads until until()
+    is true, returning (latencies, errors, seconds).
+    """
+    from werkzeug.datastructures import MultiDict
+    from app import search_page
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def reader(offset):
+        with app.app_context():
+            i = offset
+            while not until():
+                name, args = QUERIES[i % len(QUERIES)]
+                i += 1
+                start = time.perf_counter()
+                try:
+                    search_page(MultiDict(args))
+                except Exception as e:
+                    with lock:
+                        errors.append(f"{name}: {type(e).__name__}: {e}"[:200])
+                    continue
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=reader, args=(i,), name=f'reader-{i}') for i in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='rows per schedule sheet in each workbook')
+    parser.add_argument('--readers', type=int, default=4, help='concurrent reader threads')
+    parser.add_argument('--idle-seconds', type=float, default=3.0, help='how long to measure reads with no load running')
+    parser.add_argument('--seed', type=int, default=0)
+    add_output_arguments(parser, 'concurrency', scratch=True)
+    args = parser.parse_args()
+    with scratch_directory('concurrency', args.keep) as workdir:
+        return bench(args, workdir)
+
+def bench(args, workdir):
+    import logging
+    from app import app, search_cache
+    import data_extractor
+    from database import insert_data
+    from synthetic import write_form460_xlsx
+    app.logger.setLevel(logging.WARNING)
+    app.config['ANALYTICS_DIR'] = os.path.join(workdir, 'analytics')
+    search_cache.maxsize = 0 # Every search goes to the database
+
+    start = time.perf_counter()
+    with app.app_context():
+        extracted = []
+        for i, name in enumerate(('baseline', 'bulk')):
+            path = os.path.join(workdir, f'synthetic_form460_{name}.xlsx')
+            write_form460_xlsx(path, args.rows, data_extractor.CONTRIBUTION_SHEETS[:2],
+                data_extractor.EXPENDITURE_SHEETS[:2], seed=args.seed + i)
+            extracted.append(data_extractor.process_uploaded_file(path))
+        baseline, bulk = extracted
+        fresh_database()
+        insert_data(baseline)
+    print(f"Generated and loaded the baseline workbook in {time.perf_counter() - start:.1f}s ({workdir})")
+
+    deadline = time.perf_counter() + args.idle_seconds
+    idle = latency_summary(*run_readers(app, args.readers, lambda: time.perf_counter() >= deadline))
+
+    load = {}
+    loaded = threading.Event()
+
+    def writer():
+        with app.app_context():
+            start = time.perf_counter()
+            try:
+                load['stats'] = insert_data(bulk)
+            except Exception as e:
+                load['error'] = f"{type(e).__name__}: {e}"
+            load['seconds'] = time.perf_counter() - start
+            loaded.set()
+
+    writer_thread = threading.Thread(target=writer, name='bulk-load')
+    writer_thread.start()
+    during_load = latency_summary(*run_readers(app, args.readers, loaded.is_set))
+    writer_thread.join()
+    if 'error' in load:
+        raise SystemExit(f"The bulk load failed: {load['error']}")
+
+    rows = len(bulk['contributions']) + len(bulk['expenditures'])
+    print(f"  bulk load: {rows} rows in {load['seconds']:.2f}s ({load['stats']['rows_per_sec']:,.0f} rows/s)")
+    for name, summary in (('idle', idle), ('during load', during_load)):
+        print(f"  {name:<12} {summary['queries']:6} searches  p50 {summary['p50_ms'] or 0:8.2f} ms  "
+            f"p95 {summary['p95_ms'] or 0:8.2f} ms  max {summary['max_ms'] or 0:8.2f} ms  errors {summary['errors']}")
+        for sample in summary['error_samples']:
+            print(f"    {sample}")
+
+    write_result(args.output, 'concurrency', params(args),
+        load={'rows': rows, 'seconds': load['seconds'], 'rows_per_sec': load['stats']['rows_per_sec']},
+        idle=idle, during_load=during_load)
+    return 1 if during_load['errors'] or idle['errors'] else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+"""
+Entity resolution benchmark on synthetic donor names.
+
+Usage (from the legacy/ directory):
+    python benchmarks/bench_entities.py [--names 1000000] [--identities 200000] [--upload-size 50000] [--output FILE]
+
+Generates --names contributor names for --identities people and organizations,
+spelled the way filings spell them (see synthetic.donor_names), and resolves
+them with database.resolve_entities into an empty database, --upload-size names
+per transaction in INSERT_BATCH_SIZE batches, as uploads would. Reports:
+
+    throughput   names resolved per second, for the first and last uploads and
+                 overall. Each upload only looks up its own names, so the last
+                 upload should be about as fast as the first however many names
+                 are already known.
+    quality      pairwise precision and recall against the generated identities:
+                 of the name pairs given one entity_id, the share that really are
+                 one identity, and of the pairs that are one identity, the share
+                 given one entity_id.
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+LEGACY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LEGACY_DIR)
+
+from harness import add_output_arguments, params, scratch_directory, fresh_database, write_result
+
+def pairs(count):
+    return count * (count - 1) // 2
+
+def pairwise_quality(assigned, truth):
+    """Pairwise precision and recall of assigned entity_ids against true identities."""
+    together = sum(pairs(count) for count in collections.Counter(zip(assigned, truth)).values())
+    assigned_pairs = sum(pairs(count) for count in collections.Counter(assigned).values())
+    true_pairs = sum(pairs(count) for count in collections.Counter(truth).values())
+    return {
+        'precision': together / assigned_pairs if assigned_pairs else 1.0,
+        'recall': together / true_pairs if true_pairs else 1.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--names', type=int, default=1000000, help='names to resolve')
+    parser.add_argument('--identities', type=int, default=200000, help='distinct people and organizations behind them')
+    parser.add_argument('--upload-size', type=int, default=50000, help='names resolved per transaction')
+    parser.add_argument('--seed', type=int, default=0)
+    add_output_arguments(parser, 'entities', scratch=True)
+    args = parser.parse_args()
+    with scratch_directory('entities', args.keep) as workdir:
+        bench(args, workdir)
+
+def bench(args, workdir):
+    import analytics
+    import database
+    from synthetic import donor_names
+    analytics.ANALYTICS_DIR = None # Nothing is exported; keep the store out of the timings
+
+    start = time.perf_counter()
+    generated = donor_names(args.names, args.identities, seed=args.seed)
+    print(f"Generated {len(generated):,} names for {args.identities:,} identities in {time.perf_counter() - start:.1f}s ({workdir})")
+    fresh_database()
+
+    assigned = []
+    uploads = []
+    for upload_start in range(0, len(generated), args.upload_size):
+        upload = [name for name, _ in generated[upload_start:upload_start + args.upload_size]]
+        start = time.perf_counter()
+        with database.WRITE_LOCK, database.ENGINE.begin() as connection:
+            for batch_start in range(0, len(upload), database.INSERT_BATCH_SIZE):
+                batch = upload[batch_start:batch_start + database.INSERT_BATCH_SIZE]
+                entity_ids = database.resolve_entities(connection, batch)
+                assigned.extend(entity_ids[name] for name in batch)
+        seconds = time.perf_counter() - start
+        uploads.append({'names': len(upload), 'seconds': seconds, 'names_per_sec': len(upload) / seconds})
+        print(f"  upload {len(uploads):3}: {len(upload):,} names in {seconds:6.2f}s ({len(upload) / seconds:9,.0f} names/s, "
+            f"{upload_start + len(upload):,} resolved so far)")
+
+    with database.ENGINE.connect() as connection:
+        entity_count = connection.execute(database.sqlalchemy.select(database.func.count()).select_from(database.entities_table)).scalar()
+        spelling_count = connection.execute(database.sqlalchemy.select(database.func.count()).select_from(database.entity_names_table)).scalar()
+    seconds = sum(upload['seconds'] for upload in uploads)
+    quality = pairwise_quality(assigned, [identity for _, identity in generated])
+    distinct_identities = len({identity for _, identity in generated})
+    print(f"  {len(generated):,} names in {seconds:.1f}s ({len(generated) / seconds:,.0f} names/s): "
+        f"first upload {uploads[0]['names_per_sec']:,.0f} names/s, last {uploads[-1]['names_per_sec']:,.0f} names/s")
+    print(f"  {spelling_count:,} distinct spellings -> {entity_count:,} entities for {distinct_identities:,} identities; "
+        f"pairwise precision {quality['precision']:.4f}, recall {quality['recall']:.4f}")
+
+    write_result(args.output, 'entities', params(args), seconds=seconds, names_per_sec=len(generated) / seconds,
+        uploads=uploads, identities=distinct_identities, spellings=spelling_count, entities=entity_count, quality=quality)
+
+if __name__ == '__main__':
+    main()
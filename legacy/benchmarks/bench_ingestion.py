@@ -0,0 +1,217 @@
+"""
+End-to-end ingestion benchmark on synthetic Form 460 filings.
+
+Usage (from the legacy/ directory):
+    python benchmarks/bench_ingestion.py [--rows 2000] [--pdf-pages 10] [--image-pdf] [--output FILE]
+
+Generates a workbook, a text-layer PDF and (with --image-pdf) an image-only
+PDF. Each goes through the same path as an upload: process_uploaded_file ->
+insert_data -> the index page's queries. Each file is timed stage by stage:
+
+    open       open the file (pandas ExcelFile / PyMuPDF)
+    parse      read the sheets into DataFrames / get page text (text layer or OCR)
+    normalize  turn sheets / page text into records
+    extract    the whole of process_uploaded_file, for comparison with the above
+    insert     insert_data into an empty database (and the Parquet analytics store)
+    reinsert   insert_data again (every row is a duplicate)
+    query      each index-page query, best of --query-runs with the result cache
+               cleared (the cached time is recorded alongside)
+"""
+import argparse
+import os
+import sys
+import time
+
+LEGACY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LEGACY_DIR)
+
+from harness import add_output_arguments, params, scratch_directory, fresh_database, write_result
+
+# Index page queries: (name, request arguments)
+QUERIES = [
+    ('first_page', {}),
+    ('filer_name', {'filer_name': 'Friends of'}),
+    ('entity_name', {'entity_name': 'Garcia'}),
+    ('amount_range', {'min_amount': '500', 'max_amount': '1000'}),
+    ('date_range', {'start_date': '2023-01-01', 'end_date': '2023-12-31'}),
+]
+
+class StageTimer:
+    """Collects named stage timings: `with timer('parse'): ...`"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, name):
+        timer = self
+
+        class _Stage:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.stages[name] = timer.stages.get(name, 0.0) + time.perf_counter() - self.start
+        return _Stage()
+
+def tesseract_available():
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def stage_xlsx(path, timer):
+    """Runs the stages of extract_data_from_xlsx one by one, returning the record counts."""
+    import pandas as pd
+    import data_extractor
+    import schedules
+    with timer('open'):
+        xls = pd.ExcelFile(path)
+    sheets = {}
+    with timer('parse'):
+        for sheet_name in xls.sheet_names:
+            if sheet_name in data_extractor.CONTRIBUTION_SHEETS or sheet_name in data_extractor.EXPENDITURE_SHEETS:
+                df = pd.read_excel(xls, sheet_name=sheet_name)
+                df.columns = [col.lower() for col in df.columns]
+                sheets[sheet_name] = df
+    contributions = expenditures = 0
+    with timer('normalize'):
+        for sheet_name, df in sheets.items():
+            extract = schedules.extractor_for(schedules.schedule_for(sheet_name), df.columns)
+            records = extract(df, sheet_name, path)
+            if sheet_name in data_extractor.CONTRIBUTION_SHEETS:
+                contributions += len(records)
+            else:
+                expenditures += len(records)
+    return contributions, expenditures
+
+def stage_pdf(path, timer):
+    """Runs the stages of extract_data_from_pdf one by one, returning the record counts."""
+    import fitz
+    import data_extractor
+    import pdf_parser
+    with timer('open'):
+        with fitz.open(path) as doc:
+            doc.page_count
+    with timer('parse'):
+        page_texts, report = data_extractor._extract_page_texts(path)
+    with timer('normalize'):
+        contributions, expenditures = pdf_parser.parse_pages(page_texts, path)
+    failed = sum(1 for entry in report if entry['method'] == 'failed')
+    if failed:
+        print(f"    warning: OCR failed on {failed} of {len(report)} pages")
+    return len(contributions), len(expenditures)
+
+def bench_file(app, kind, path, expected_rows, query_runs):
+    from werkzeug.datastructures import MultiDict
+    from data_extractor import process_uploaded_file
+    from database import insert_data
+    from app import search_page, search_cache
+
+    timer = StageTimer()
+    with app.app_context():
+        staged = stage_xlsx(path, timer) if kind == 'xlsx' else stage_pdf(path, timer)
+        with timer('extract'):
+            data = process_uploaded_file(path)
+        extracted = (len(data['contributions']), len(data['expenditures']))
+        if extracted != staged:
+            raise SystemExit(f"{kind}: staged extraction found {staged} records but process_uploaded_file found {extracted}")
+
+        fresh_database()
+        with timer('insert'):
+            stats = insert_data(data)
+        with timer('reinsert'):
+            insert_data(data)
+
+        queries = {}
+        for name, args in QUERIES:
+            timings = []
+            for _ in range(query_runs):
+                search_cache.clear() # Time the queries, not the result cache
+                start = time.perf_counter()
+                page = search_page(MultiDict(args))
+                timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            search_page(MultiDict(args))
+            cached = time.perf_counter() - start
+            queries[name] = {'seconds': min(timings), 'cached_seconds': cached, 'rows': len(page['contributions']) + len(page['expenditures'])}
+        timer.stages['query'] = sum(query['seconds'] for query in queries.values())
+
+    rows = sum(extracted)
+    return {
+        'input': kind,
+        'file': os.path.basename(path),
+        'bytes': os.path.getsize(path),
+        'rows_generated': expected_rows,
+        'contributions': extracted[0],
+        'expenditures': extracted[1],
+        'stages': timer.stages,
+        'extract_rows_per_sec': rows / timer.stages['extract'] if timer.stages['extract'] else None,
+        'insert_rows_per_sec': stats['rows_per_sec'],
+        'queries': queries,
+    }
+
+def print_result(result):
+    print(f"  {result['input']}: {result['file']} ({result['bytes'] / 1024:,.0f} KiB, "
+        f"{result['contributions']} contributions, {result['expenditures']} expenditures)")
+    for name, seconds in result['stages'].items():
+        print(f"    {name:<10} {seconds * 1000:10.1f} ms")
+    for name, query in result['queries'].items():
+        print(f"      {name:<14} {query['seconds'] * 1000:8.2f} ms  ({query['rows']} rows, cached {query['cached_seconds'] * 1000:.2f} ms)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000, help='rows per schedule sheet in the workbook')
+    parser.add_argument('--contribution-sheets', type=int, default=2, help='contribution sheets to fill')
+    parser.add_argument('--expenditure-sheets', type=int, default=2, help='expenditure sheets to fill')
+    parser.add_argument('--pdf-pages', type=int, default=10, help='pages per PDF (0 skips PDFs)')
+    parser.add_argument('--rows-per-page', type=int, default=15, help='records per PDF page')
+    parser.add_argument('--image-pdf', action='store_true', help='also benchmark an image-only PDF (needs tesseract)')
+    parser.add_argument('--query-runs', type=int, default=5, help='report the best of this many runs per query')
+    parser.add_argument('--seed', type=int, default=0)
+    add_output_arguments(parser, 'ingestion', scratch=True)
+    args = parser.parse_args()
+    with scratch_directory('ingestion', args.keep) as workdir:
+        bench(args, workdir)
+
+def bench(args, workdir):
+    import logging
+    from app import app
+    import data_extractor
+    from synthetic import write_form460_xlsx, write_form460_pdf
+    app.logger.setLevel(logging.WARNING)
+    app.config['OCR_CACHE_DIR'] = None # Measure OCR, not the cache
+    app.config['ANALYTICS_DIR'] = os.path.join(workdir, 'analytics')
+
+    inputs = []
+    start = time.perf_counter()
+    xlsx_path = os.path.join(workdir, 'synthetic_form460.xlsx')
+    rows = write_form460_xlsx(xlsx_path, args.rows,
+        data_extractor.CONTRIBUTION_SHEETS[:args.contribution_sheets],
+        data_extractor.EXPENDITURE_SHEETS[:args.expenditure_sheets], seed=args.seed)
+    inputs.append(('xlsx', xlsx_path, rows))
+    skipped = {}
+    if args.pdf_pages:
+        pdf_path = os.path.join(workdir, 'synthetic_form460_text.pdf')
+        inputs.append(('pdf_text', pdf_path, write_form460_pdf(pdf_path, args.pdf_pages, args.rows_per_page, seed=args.seed)))
+        if args.image_pdf:
+            if tesseract_available():
+                pdf_path = os.path.join(workdir, 'synthetic_form460_image.pdf')
+                inputs.append(('pdf_image', pdf_path,
+                    write_form460_pdf(pdf_path, args.pdf_pages, args.rows_per_page, image_only=True, seed=args.seed)))
+            else:
+                skipped['pdf_image'] = 'tesseract is not available'
+                print("Skipping the image-only PDF: tesseract is not available.")
+    print(f"Generated {len(inputs)} input file(s) in {time.perf_counter() - start:.1f}s ({workdir})")
+
+    results = []
+    for kind, path, expected_rows in inputs:
+        result = bench_file(app, kind, path, expected_rows, args.query_runs)
+        print_result(result)
+        results.append(result)
+
+    write_result(args.output, 'ingestion', params(args), skipped=skipped, results=results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmarks the streaming PDF record parser (pdf_parser.RecordParser) against
+the original two-pass parser, on a corpus of Form 460 page texts.
+
+Usage (from the legacy/ directory):
+    python benchmarks/bench_pdf_parsing.py [filing.pdf ...] [--filings 200] [--pages 20] [--repeat 3] [--output FILE]
+
+The corpus is --filings synthetic filings (see synthetic.form460_page_texts),
+plus the page texts of any PDFs given, read through their text layer or the OCR
+cache as extraction reads them. Texts are produced up front, so the timings only
+cover parsing. Each parser runs over the whole corpus --repeat times and the best
+run counts; the streaming parser is fed one page at a time, as it is during
+extraction. The script also checks, filing by filing, that:
+
+    - both parsers return identical records, apart from the page and line the
+      streaming parser adds;
+    - each record's page and line point at the line its name was read from.
+
+It reports lines parsed per second for both and the share of records the
+streaming parser emits before the last page arrives. Exits with status 1 if
+any check fails.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+from flask import Flask, current_app
+
+LEGACY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LEGACY_DIR)
+
+import data_extractor
+import pdf_parser
+from harness import add_output_arguments, params, write_result
+from synthetic import form460_page_texts
+
+POSITION_KEYS = ('page', 'line')
+
+def parse_two_pass(page_texts, file_path):
+    """
+    The original two-pass PDF parser, which joins every page before parsing.
+    pdf_parser.RecordParser is timed and checked against it.
+    """
+    contributions = []
+    expenditures = []
+    filer_name = "Unknown Filer"
+
+    # Regex to find amounts and dates
+    amount_regex = re.compile(r'[\$]?\s*(\d{1,3}(?:,\d{3})*\.\d{2})')
+    date_regex = re.compile(r'(\d{1,2}/\d{1,2}/\d{2,4})')
+
+    full_text = "".join(page_texts)
+    lines = full_text.split('\n')
+    current_schedule = None
+    info_buffer = []
+
+    # First pass to find the filer name
+    for i, line in enumerate(lines):
+        if "NAME OF FILER" in line.upper():
+            # Look for the name on the next non-empty line
+            for next_line in lines[i+1:]:
+                if next_line.strip():
+                    filer_name = next_line.strip()
+                    current_app.logger.info(f"  Found Filer Name: {filer_name}")
+                    break
+            break
+
+    # Second pass for data extraction
+    for line in lines:
+        line_upper = line.upper()
+        if "SCHEDULE A" in line_upper or "SCHEDULE C" in line_upper:
+            current_schedule = 'CONTRIBUTION'
+            info_buffer = []
+            continue
+        if "SCHEDULE E" in line_upper:
+            current_schedule = 'EXPENDITURE'
+            info_buffer = []
+            continue
+        if "SUMMARY PAGE" in line_upper:
+            current_schedule = None
+            info_buffer = []
+            continue
+
+        if not current_schedule:
+            continue
+
+        # Check if the line contains a final amount, indicating end of a record
+        match = amount_regex.search(line)
+        if match:
+            amount = float(match.group(1).replace(',', ''))
+            
+            # Combine the buffer and current line to find all info
+            full_record_text = " ".join(info_buffer) + " " + line
+            
+            # Find date
+            date_match = date_regex.search(full_record_text)
+            found_date = date_match.group(1) if date_match else None
+
+            # The rest of the line is the description
+            description = amount_regex.sub('', line).strip()
+
+            if not info_buffer:
+                continue
+
+            name = info_buffer[0]
+
+            record = {
+                "filer_name": filer_name,
+                "contribution_amount": amount if current_schedule == 'CONTRIBUTION' else None,
+                "expenditure_amount": amount if current_schedule == 'EXPENDITURE' else None,
+                "contributor_name": name if current_schedule == 'CONTRIBUTION' else None,
+                "payee_name": name if current_schedule == 'EXPENDITURE' else None,
+                "expenditure_description": description,
+                "contribution_date": found_date if current_schedule == 'CONTRIBUTION' else None,
+                "expenditure_date": found_date if current_schedule == 'EXPENDITURE' else None,
+                "source_file": os.path.basename(file_path)
+            }
+            
+            record = {k: v for k, v in record.items() if v is not None}
+
+            if current_schedule == 'CONTRIBUTION':
+                contributions.append(record)
+            elif current_schedule == 'EXPENDITURE':
+                expenditures.append(record)
+            
+            info_buffer = [] # Reset for the next record
+        else:
+            # If it's not an amount line, add its text to the buffer
+            if line.strip():
+                info_buffer.append(line.strip())
+
+    return contributions, expenditures
+
+def run(corpus, streaming):
+    """Parses every filing, returning (per-filing (contributions, expenditures), elapsed seconds)."""
+    results = []
+    start = time.perf_counter()
+    for path, page_texts in corpus:
+        if streaming:
+            results.append(pdf_parser.parse_pages(page_texts, path))
+        else:
+            results.append(parse_two_pass(page_texts, path))
+    return results, time.perf_counter() - start
+
+def best_of(runs, corpus, streaming):
+    results, best = run(corpus, streaming)
+    for _ in range(runs - 1):
+        best = min(best, run(corpus, streaming)[1])
+    return results, best
+
+def check_filing(page_texts, reference, streamed):
+    """Returns the problems found comparing one filing's streamed records with the reference parser's."""
+    problems = []
+    pages = [text.split('\n') for text in page_texts]
+    for table, expected, records in zip(('contributions', 'expenditures'), reference, streamed):
+        if len(expected) != len(records):
+            problems.append(f"{len(records)} {table}, expected {len(expected)}")
+            continue
+        name_field = 'contributor_name' if table == 'contributions' else 'payee_name'
+        for number, (old, new) in enumerate(zip(expected, records)):
+            if list(old.items()) != [(key, value) for key, value in new.items() if key not in POSITION_KEYS]:
+                problems.append(f"{table}[{number}]: {new} != {old}")
+                continue
+            try:
+                line = pages[new['page'] - 1][new['line'] - 1]
+            except (KeyError, IndexError):
+                problems.append(f"{table}[{number}]: no line at page {new.get('page')}, line {new.get('line')}")
+                continue
+            # A line a page ends without a newline runs on into the next page
+            if not new[name_field].startswith(line.strip()):
+                problems.append(f"{table}[{number}]: page {new['page']}, line {new['line']} is {line!r}, not {new[name_field]!r}")
+    return problems
+
+def emitted_before_last_page(corpus):
+    """Share of records the streaming parser hands back before it is given the last page."""
+    early = total = 0
+    for path, page_texts in corpus:
+        parser = pdf_parser.RecordParser(path)
+        for page_number, text in enumerate(page_texts, 1):
+            count = sum(len(records) for records in parser.feed(page_number, text).values())
+            early += count if page_number < len(page_texts) else 0
+            total += count
+        total += sum(len(records) for records in parser.close().values())
+    return early / total if total else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='*', help='PDF filings to add to the corpus')
+    parser.add_argument('--filings', type=int, default=200, help='synthetic filings in the corpus')
+    parser.add_argument('--pages', type=int, default=20, help='schedule pages per synthetic filing')
+    parser.add_argument('--rows-per-page', type=int, default=15)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per parser; the best one counts')
+    parser.add_argument('--seed', type=int, default=0)
+    add_output_arguments(parser, 'pdf_parsing')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with app.app_context():
+        start = time.perf_counter()
+        corpus = [(f'synthetic_form460_{number}.pdf', form460_page_texts(args.pages, args.rows_per_page, seed=args.seed + number))
+            for number in range(args.filings)]
+        for path in args.pdfs:
+            corpus.append((path, data_extractor._extract_page_texts(path)[0]))
+        page_count = sum(len(page_texts) for _, page_texts in corpus)
+        line_count = sum(text.count('\n') + 1 for _, page_texts in corpus for text in page_texts)
+        print(f"Corpus: {len(corpus)} filings, {page_count:,} pages, {line_count:,} lines "
+            f"(built in {time.perf_counter() - start:.1f}s)")
+
+        reference, reference_seconds = best_of(args.repeat, corpus, streaming=False)
+        streamed, streaming_seconds = best_of(args.repeat, corpus, streaming=True)
+
+    records = sum(len(contributions) + len(expenditures) for contributions, expenditures in reference)
+    for name, seconds in (('two-pass', reference_seconds), ('streaming', streaming_seconds)):
+        print(f"  {name:<10} {seconds:7.3f}s  {line_count / seconds:12,.0f} lines/s  {page_count / seconds:10,.0f} pages/s")
+    print(f"  speedup: {reference_seconds / streaming_seconds:.2f}x")
+    early = emitted_before_last_page(corpus)
+    print(f"  {early:.1%} of records emitted before the last page arrived")
+
+    failures = {}
+    for (path, page_texts), old, new in zip(corpus, reference, streamed):
+        problems = check_filing(page_texts, old, new)
+        if problems:
+            failures[path] = problems
+    if failures:
+        print(f"  MISMATCH in {len(failures)} of {len(corpus)} filings")
+        for path, problems in list(failures.items())[:5]:
+            print(f"    {path}: {len(problems)} problem(s), e.g. {problems[0]}")
+    else:
+        print(f"  records identical ({records} records), positions check out")
+
+    write_result(args.output, 'pdf_parsing', params(args),
+        corpus={'filings': len(corpus), 'pages': page_count, 'lines': line_count, 'records': records},
+        two_pass_seconds=reference_seconds, streaming_seconds=streaming_seconds,
+        speedup=reference_seconds / streaming_seconds, emitted_before_last_page=early,
+        mismatched_filings=len(failures))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,121 @@
+"""
+Startup cost benchmark: how long the app and CLI entry points take to import,
+and which modules that time goes to.
+
+Usage (from the legacy/ directory):
+    python benchmarks/bench_startup.py [--runs 5] [--top 8] [--target NAME=STATEMENT ...] [--output FILE]
+
+Each target runs --runs times in a fresh interpreter under `python -X importtime`,
+from a scratch directory (importing app opens its log files in the working
+directory). For each target it reports:
+
+    wall       median process time, minus that of an interpreter that imports nothing
+    imports    median time spent importing, as reported by -X importtime
+    modules    the top-level packages taking the most import time (summed self
+               time of the package and its submodules, averaged over runs)
+    heavy      which of the extraction/analytics libraries got loaded
+
+The default targets are the web app, the batch CLI and the modules behind them,
+plus what each extraction path adds once it is first used.
+"""
+import argparse
+import collections
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+LEGACY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(LEGACY_DIR)
+sys.path.insert(0, LEGACY_DIR)
+
+from harness import add_output_arguments, scratch_directory, write_result
+
+# name -> statement run in a fresh interpreter
+TARGETS = {
+    'app': 'import app', # Web worker startup
+    'batch_ingest': 'import batch_ingest', # CLI startup
+    'analyze_docs': 'import analyze_docs',
+    'database': 'import database',
+    'data_extractor': 'import data_extractor',
+    'analytics': 'import analytics',
+    # What each path imports on first use, on top of data_extractor
+    'xlsx_path': 'import data_extractor, openpyxl, pandas, numpy',
+    'pdf_text_path': 'import data_extractor, fitz',
+    'pdf_ocr_path': 'import data_extractor, fitz, PIL.Image; data_extractor._tesseract()',
+    'analytics_path': 'import analytics, pyarrow.dataset, pyarrow.compute',
+}
+
+# Libraries that should only load on the code paths that need them
+HEAVY = ('pandas', 'numpy', 'pyarrow', 'fitz', 'pymupdf', 'pytesseract', 'PIL', 'openpyxl', 'pypdf')
+
+# Printed after -X importtime's output, so the loaded modules can be checked
+REPORT = "import sys; print('LOADED ' + ' '.join(sorted({name.split('.')[0] for name in sys.modules})))"
+
+def run_target(statement, workdir):
+    """Runs one statement in a fresh interpreter. Returns (wall seconds, importtime lines, loaded top-level modules)."""
+    env = dict(os.environ, TEMP=workdir, PYTHONPATH=os.pathsep.join([LEGACY_DIR, REPO_DIR]))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"{statement}\n{REPORT}"],
+        cwd=workdir, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr[-2000:]}")
+    loaded = next((line.split()[1:] for line in result.stdout.splitlines() if line.startswith('LOADED ')), [])
+    return wall, [line for line in result.stderr.splitlines() if line.startswith('import time:')], set(loaded)
+
+def parse_importtime(lines):
+    """Returns (total import seconds, top-level package -> summed self seconds) from -X importtime output."""
+    total = 0.0
+    packages = collections.Counter()
+    for line in lines[1:]: # The first line is the column header
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name[1:] # Nesting is shown by indenting past the one separating space
+        packages[name.strip().split('.')[0]] += int(self_us) / 1e6
+        if not name.startswith(' '):
+            total += int(cumulative_us) / 1e6 # Imports at the top level of the statement
+    return total, packages
+
+def bench_target(statement, runs, baseline, workdir):
+    walls, imports = [], []
+    packages = collections.Counter()
+    for _ in range(runs):
+        wall, lines, loaded = run_target(statement, workdir)
+        total, run_packages = parse_importtime(lines)
+        walls.append(wall)
+        imports.append(total)
+        packages.update(run_packages)
+    return {
+        'statement': statement,
+        'wall_seconds': max(statistics.median(walls) - baseline, 0.0),
+        'import_seconds': statistics.median(imports),
+        'modules': {name: seconds / runs for name, seconds in packages.most_common()},
+        'heavy_loaded': sorted(name for name in HEAVY if name in loaded),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per target')
+    parser.add_argument('--top', type=int, default=8, help='modules listed per target')
+    parser.add_argument('--target', action='append', default=[], metavar='NAME=STATEMENT',
+        help='benchmark this statement instead of the default targets (repeatable)')
+    add_output_arguments(parser, 'startup')
+    args = parser.parse_args()
+    targets = dict(target.split('=', 1) for target in args.target) if args.target else TARGETS
+
+    with scratch_directory('startup') as workdir:
+        baseline = statistics.median(run_target('pass', workdir)[0] for _ in range(args.runs))
+        print(f"Interpreter startup: {baseline * 1000:.0f} ms (subtracted from wall times)")
+        results = {}
+        for name, statement in targets.items():
+            result = results[name] = bench_target(statement, args.runs, baseline, workdir)
+            print(f"  {name:<16} wall {result['wall_seconds'] * 1000:7.0f} ms  imports {result['import_seconds'] * 1000:7.0f} ms  "
+                f"heavy: {', '.join(result['heavy_loaded']) or 'none'}")
+            for module, seconds in list(result['modules'].items())[:args.top]:
+                print(f"      {module:<20} {seconds * 1000:7.1f} ms")
+
+    write_result(args.output, 'startup', {'runs': args.runs}, interpreter_seconds=baseline, results=results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Benchmarks the columnar XLSX extraction path (the compiled schedule extractors)
+against the original per-row loop.
+
+Usage (from the legacy/ directory):
+    python benchmarks/bench_xlsx_extraction.py [workbook.xlsx] [--repeat N]
+
+Sheets are read once up front so the timings only cover turning sheet rows into
+records. --repeat tiles every sheet N times to simulate county-wide workbooks.
+The script also checks both paths return identical records.
+"""
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+
+import pandas as pd
+from flask import Flask, current_app
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schedules
+from data_extractor import CONTRIBUTION_SHEETS, EXPENDITURE_SHEETS
+
+DEFAULT_WORKBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Indio_2024.xlsx')
+
+def load_sheets(path, repeat):
+    """Reads every known schedule sheet into a lowercased DataFrame, tiled `repeat` times."""
+    sheets = {}
+    xls = pd.ExcelFile(path)
+    for sheet_name in xls.sheet_names:
+        if sheet_name not in CONTRIBUTION_SHEETS and sheet_name not in EXPENDITURE_SHEETS:
+            continue
+        df = pd.read_excel(xls, sheet_name=sheet_name)
+        df.columns = [col.lower() for col in df.columns]
+        sheets[sheet_name] = pd.concat([df] * repeat, ignore_index=True) if repeat > 1 else df
+    return sheets
+
+def same_value(a, b):
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+def same_records(left, right):
+    if len(left) != len(right):
+        return False
+    for a, b in zip(left, right):
+        if a.keys() != b.keys() or not all(same_value(a[k], b[k]) for k in a):
+            return False
+    return True
+
+def contribution_records_rowwise(df, sheet_name, file_path):
+    """
+    The original row-by-row loop for contribution sheets, which the compiled
+    extractors (schedules.extractor_for) replaced.
+    """
+    contributions = []
+    # Per-row logging is only formatted when DEBUG is on; otherwise it costs one check per sheet
+    debug = current_app.logger.isEnabledFor(logging.DEBUG)
+    for index, row in df.iterrows():
+        try:
+            filer_name = row.get('filer_naml', '')
+            first_name = row.get('tran_namf', '')
+            last_name = row.get('tran_naml', '')
+            contribution_amount = row.get('tran_amt1')
+            contribution_date = row.get('tran_date')
+
+            contributor_name = f"{first_name} {last_name}".strip()
+
+            if debug:
+                current_app.logger.debug(f"    Row {index}: Filer='{filer_name}', Contributor='{contributor_name}', Amount='{contribution_amount}', Date='{contribution_date}'")
+
+            if not contributor_name or pd.isna(contribution_amount):
+                if debug:
+                    current_app.logger.debug(f"      Skipping row {index}: Missing contributor name or amount.")
+                continue
+
+            record = {
+                "filer_name": filer_name,
+                "contributor_name": contributor_name,
+                "contribution_amount": float(contribution_amount) if pd.notna(contribution_amount) else 0.0,
+                "contribution_date": str(contribution_date) if pd.notna(contribution_date) else None,
+                "source_file": os.path.basename(file_path)
+            }
+            if debug:
+                current_app.logger.debug(f"      Appending contribution record: {record}")
+            contributions.append(record)
+        except Exception as e:
+            current_app.logger.error(f"Error processing row {index} in sheet '{sheet_name}' in {file_path}: {e}", exc_info=True)
+            continue # Continue to next row if error occurs
+    return contributions
+
+def expenditure_records_rowwise(df, sheet_name, file_path):
+    """
+    The original row-by-row loop for expenditure sheets, which the compiled
+    extractors (schedules.extractor_for) replaced.
+    """
+    expenditures = []
+    debug = current_app.logger.isEnabledFor(logging.DEBUG)
+    for index, row in df.iterrows():
+        try:
+            filer_name = row.get('filer_naml', '')
+            payee_name_first = row.get('payee_namf', '')
+            payee_name_last = row.get('payee_naml', '')
+
+            # Handle different amount columns for expenditures
+            expenditure_amount = row.get('amount') # Common for F461P5, D, G, E
+            if pd.isna(expenditure_amount): # Fallback for F-Expenses
+                expenditure_amount = row.get('amt_paid')
+
+            # Handle different date columns for expenditures
+            expenditure_date = row.get('expn_date') # Common for F461P5, D, G, E
+            if pd.isna(expenditure_date): # Fallback for F-Expenses
+                expenditure_date = row.get('rpt_date')
+
+            expenditure_description = row.get('expn_dscr', '')
+            if not expenditure_description: # Fallback for other description columns
+                expenditure_description = row.get('tran_dscr', '')
+
+            payee_name = f"{payee_name_first} {payee_name_last}".strip()
+
+            if debug:
+                current_app.logger.debug(f"      Extracted: Filer='{filer_name}', Payee='{payee_name}', Amount='{expenditure_amount}', Date='{expenditure_date}', Description='{expenditure_description}'")
+
+            if not payee_name or pd.isna(expenditure_amount):
+                if debug:
+                    current_app.logger.debug(f"      Skipping row {index}: Missing payee name or amount.")
+                continue
+
+            record = {
+                "filer_name": filer_name,
+                "payee_name": payee_name,
+                "expenditure_amount": float(expenditure_amount) if pd.notna(expenditure_amount) else 0.0,
+                "expenditure_date": str(expenditure_date) if pd.notna(expenditure_date) else None,
+                "expenditure_description": expenditure_description,
+                "source_file": os.path.basename(file_path)
+            }
+            if debug:
+                current_app.logger.debug(f"      Appending expenditure record: {record}")
+            expenditures.append(record)
+        except Exception as e:
+            current_app.logger.error(f"Error processing row {index} in sheet '{sheet_name}' in {file_path}: {e}", exc_info=True)
+            continue # Continue to next row if error occurs
+    return expenditures
+
+def run(sheets, file_path, rowwise):
+    """Extracts records from every sheet, returning (records, elapsed seconds)."""
+    records = []
+    start = time.perf_counter()
+    for sheet_name, df in sheets.items():
+        if not rowwise:
+            extract = schedules.extractor_for(schedules.schedule_for(sheet_name), df.columns)
+            records.extend(extract(df, sheet_name, file_path))
+        elif sheet_name in CONTRIBUTION_SHEETS:
+            records.extend(contribution_records_rowwise(df, sheet_name, file_path))
+        else:
+            records.extend(expenditure_records_rowwise(df, sheet_name, file_path))
+    return records, time.perf_counter() - start
+
+def best_of(runs, sheets, file_path, rowwise):
+    results = [run(sheets, file_path, rowwise) for _ in range(runs)]
+    return results[0][0], min(seconds for _, seconds in results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('workbook', nargs='?', default=DEFAULT_WORKBOOK)
+    parser.add_argument('--repeat', type=int, default=1, help='tile each sheet this many times')
+    parser.add_argument('--runs', type=int, default=3, help='report the best of this many runs')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with app.app_context():
+        sheets = load_sheets(args.workbook, args.repeat)
+        rows = sum(len(df) for df in sheets.values())
+        print(f"Workbook: {os.path.basename(args.workbook)} ({len(sheets)} schedule sheets, {rows} rows)")
+
+        row_records, row_seconds = best_of(args.runs, sheets, args.workbook, rowwise=True)
+        col_records, col_seconds = best_of(args.runs, sheets, args.workbook, rowwise=False)
+
+        print(f"  row loop: {row_seconds * 1000:10.1f} ms  ({rows / row_seconds:,.0f} rows/sec)")
+        print(f"  columnar: {col_seconds * 1000:10.1f} ms  ({rows / col_seconds:,.0f} rows/sec)")
+        print(f"  speedup:  {row_seconds / col_seconds:10.1f}x")
+
+        if not same_records(row_records, col_records):
+            print("  MISMATCH: columnar records differ from the row loop")
+            sys.exit(1)
+        print(f"  records identical ({len(col_records)} records)")
+
+if __name__ == '__main__':
+    main()
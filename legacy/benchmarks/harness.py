@@ -0,0 +1,94 @@
+"""
+What the benchmarks share: the scratch directory the database benchmarks run in,
+and the results file each run appends one JSON line to, so results can be
+compared across commits.
+"""
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+
+LEGACY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(LEGACY_DIR, 'benchmarks', 'results')
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=LEGACY_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _output_path(path):
+    # Made absolute up front, since scratch_directory changes the working directory
+    return path if path == '-' else os.path.abspath(path)
+
+def add_output_arguments(parser, benchmark, scratch=False):
+    """
+    Adds --output (default benchmarks/results/<benchmark>.jsonl) to a benchmark's
+    arguments, and --keep for those that run in a scratch directory.
+    """
+    parser.add_argument('--output', type=_output_path, default=os.path.join(RESULTS_DIR, f"{benchmark}.jsonl"),
+        help="JSON lines file to append results to ('-' for stdout only)")
+    if scratch:
+        parser.add_argument('--keep', action='store_true', help='keep the scratch directory')
+
+def params(args):
+    """The arguments a run was made with, for its record."""
+    return {key: value for key, value in vars(args).items() if key not in ('output', 'keep')}
+
+@contextlib.contextmanager
+def scratch_directory(benchmark, keep=False):
+    """
+    Runs the body in a new temporary directory, which is removed afterwards unless
+    keep is set. The app opens campaign_finance.db relative to the working
+    directory, so the benchmark gets a database of its own. Yields the directory.
+    """
+    workdir = tempfile.mkdtemp(prefix=f'bench_{benchmark}_')
+    os.environ.setdefault('TEMP', workdir)
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(LEGACY_DIR)
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def fresh_database():
+    """Points the app at an empty campaign_finance.db (and analytics store) in the working directory."""
+    import analytics
+    from database import ENGINE, READ_ENGINE, DB_NAME, create_database
+    analytics.clear()
+    ENGINE.dispose()
+    READ_ENGINE.dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DB_NAME + suffix):
+            os.remove(DB_NAME + suffix)
+    create_database()
+
+def write_result(output, benchmark, params, **results):
+    """
+    Records a run: the benchmark, when and where it ran, its params and results.
+    Appends it to output as one JSON line, or prints it if output is '-'.
+    """
+    record = {
+        'benchmark': benchmark,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': params,
+        **results,
+    }
+    if output == '-':
+        print(json.dumps(record, indent=2))
+    else:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Appended results to {output}")
+    return record
@@ -0,0 +1,354 @@
+"""
+Generators for synthetic Form 460 filings used by the benchmarks.
+
+Workbooks mirror the e-filing exports the extractors are written against: the
+same sheet names and header rows as the sample workbooks, with the columns the
+extractors read (filer_naml, tran_namf, tran_naml, tran_amt1, tran_date,
+payee_namf, payee_naml, amount, expn_date, expn_dscr, amt_paid, rpt_date)
+filled in. The other columns are left blank, as in the samples. PDFs have the
+"NAME OF FILER" / "SCHEDULE A" / "SCHEDULE E" layout that extract_data_from_pdf
+parses. They come either with a text layer, or as image-only pages that have
+to be OCR'd. Page texts skip the PDF altogether and give the PDF parser the
+text it would get back, with the irregular layouts real filings have.
+
+Output is deterministic for a given seed.
+"""
+import datetime
+import random
+
+import fitz  # PyMuPDF
+import openpyxl
+
+from data_extractor import CONTRIBUTION_SHEETS, EXPENDITURE_SHEETS
+
+COVER_COLUMNS = ['Filer_ID', 'Filer_NamL', 'Report_Num', 'Committee_Type', 'Rpt_Date', 'From_Date', 'Thru_Date',
+    'Elect_Date', 'tblCover_Office_Cd', 'tblCover_Offic_Dscr', 'Rec_Type', 'Form_Type', 'Tran_ID', 'Entity_Cd']
+
+CONTRIBUTION_COLUMNS = COVER_COLUMNS + ['Tran_NamL', 'Tran_NamF', 'Tran_NamT', 'Tran_NamS', 'Tran_Adr1', 'Tran_Adr2',
+    'Tran_City', 'Tran_State', 'Tran_Zip4', 'Tran_Emp', 'Tran_Occ', 'Tran_Self', 'Tran_Type', 'Tran_Date', 'Tran_Date1',
+    'Tran_Amt1', 'Tran_Amt2', 'Tran_Dscr', 'Cmte_ID', 'Tres_NamL', 'Tres_NamF', 'Tres_NamT', 'Tres_NamS', 'Tres_Adr1',
+    'Tres_Adr2', 'Tres_City', 'Tres_State', 'Tres_Zip', 'Intr_NamL', 'Intr_NamF', 'Intr_NamT', 'Intr_NamS', 'Intr_Adr1',
+    'Intr_Adr2', 'Intr_City', 'Intr_State', 'Intr_Zip4', 'Intr_Emp', 'Intr_Occ', 'Intr_Self', 'Cand_NamL', 'Cand_NamF',
+    'Cand_NamT', 'Cand_NamS', 'tblDetlTran_Office_Cd', 'tblDetlTran_Offic_Dscr', 'Juris_Cd', 'Juris_Dscr', 'Dist_No',
+    'Off_S_H_Cd', 'Bal_Name', 'Bal_Num', 'Bal_Juris', 'Sup_Opp_Cd', 'Memo_Code', 'Memo_RefNo', 'BakRef_TID',
+    'XRef_SchNm', 'XRef_Match', 'Loan_Rate', 'Int_CmteId']
+
+EXPENDITURE_COLUMNS = COVER_COLUMNS + ['Payee_NamL', 'Payee_NamF', 'Payee_NamT', 'Payee_NamS', 'Payee_Adr1',
+    'Payee_Adr2', 'Payee_City', 'Payee_State', 'Payee_Zip4', 'Expn_Date', 'Amount', 'Cum_YTD', 'Expn_ChkNo',
+    'Expn_Code', 'Expn_Dscr', 'Agent_NamL', 'Agent_NamF', 'Agent_NamT', 'Agent_NamS', 'Cmte_ID', 'Tres_NamL',
+    'Tres_NamF', 'Tres_NamT', 'Tres_NamS', 'Tres_Adr1', 'Tres_Adr2', 'Tres_City', 'Tres_ST', 'Tres_ZIP4', 'Cand_NamL',
+    'Cand_NamF', 'Cand_NamT', 'Cand_NamS', 'Office_Cd', 'Offic_Dscr', 'Juris_Cd', 'Juris_Dscr', 'Dist_No',
+    'Off_S_H_Cd', 'Bal_Name', 'Bal_Num', 'Bal_Juris', 'Sup_Opp_Cd', 'Memo_Code', 'Memo_RefNo', 'BakRef_TID',
+    'G_From_E_F', 'XRef_SchNm', 'XRef_Match']
+
+# F-Expenses reports accrued expenses: amounts in Amt_Paid and no Expn_Date (the extractor falls back to Rpt_Date)
+ACCRUED_EXPENSE_COLUMNS = COVER_COLUMNS + ['Payee_NamL', 'Payee_NamF', 'Payee_NamT', 'Payee_NamS', 'Payee_Adr1',
+    'Payee_Adr2', 'Payee_City', 'Payee_State', 'Payee_Zip4', 'Beg_Bal', 'Amt_Incur', 'Amt_Paid', 'End_Bal',
+    'Expn_Code', 'Expn_Dscr', 'Cmte_ID', 'Tres_NamL', 'Tres_NamF', 'Tres_NamT', 'Tres_NamS', 'Tres_Adr1', 'Tres_Adr2',
+    'Tres_City', 'Tres_ST', 'Tres_ZIP4', 'Memo_Code', 'Memo_RefNo', 'BakRef_TID', 'XRef_SchNm', 'XRef_Match']
+
+# Sheets the extractors skip; written with just their header rows so skipping is exercised too
+OTHER_SHEETS = {
+    'B1-Loans': COVER_COLUMNS + ['Lndr_NamL', 'Lndr_NamF', 'Loan_Date1', 'Loan_Amt1'],
+    'H-Loans': COVER_COLUMNS + ['Lndr_NamL', 'Lndr_NamF', 'Loan_Date1', 'Loan_Amt1'],
+    'Summary': COVER_COLUMNS[:12] + ['Line_Item', 'Amount_A', 'Amount_B', 'Amount_C'],
+}
+
+FIRST_NAMES = ['Maria', 'James', 'Lupe', 'Glenn', 'Nathan', 'Louisa', 'Ana', 'Robert', 'Linda', 'Jose', 'Karen',
+    'Michael', 'Sofia', 'David', 'Elena', 'Thomas', 'Patricia', 'Daniel', 'Rosa', 'Steven']
+LAST_NAMES = ['Garcia', 'Miller', 'Ramos', 'Davis', 'Smith', 'Lopez', 'Nguyen', 'Martinez', 'Johnson', 'Hernandez',
+    'Brown', 'Gonzalez', 'Wilson', 'Perez', 'Anderson', 'Sanchez', 'Taylor', 'Rivera', 'Moore', 'Torres']
+ORGANIZATIONS = ['Chandi Empire Inc', 'La Prensa Hispana', 'Jackalope Ranch', 'Bank Of America', 'FedEx',
+    'Desert Sun Printing', 'Coachella Valley Signs', 'Palm Desert Catering', 'Google Domains', 'Valley Mailers LLC']
+CITIES = [('Indio', '92201'), ('Palm Desert', '92260'), ('Rancho Mirage', '92270'), ('Coachella', '92236'),
+    ('La Quinta', '92253'), ('Cathedral City', '92234')]
+DESCRIPTIONS = ['Campaign literature', 'Catering for fundraising reception', 'Advertising', 'Postage',
+    'Yard signs', 'Website hosting', 'Consulting', 'Office supplies']
+
+def _filers(rng, count):
+    return [(str(1400000 + number), f"Friends of {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} for City Council {2020 + number % 6}")
+        for number in range(count)]
+
+def _person_or_org(rng):
+    """Returns (first name, last name); organizations have an empty first name."""
+    if rng.random() < 0.2:
+        return '', rng.choice(ORGANIZATIONS)
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+def _amount(rng):
+    return round(rng.choice([25, 50, 100, 250, 500, 1000]) * rng.uniform(0.5, 4), 2)
+
+def _date(rng, year):
+    return datetime.datetime(year, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+
+def _schedule_rows(rng, sheet_name, columns, rows, filers):
+    """Yields `rows` rows for one schedule sheet, in header order."""
+    form_type = sheet_name.split('-')[0]
+    rec_type = 'RCPT' if sheet_name in CONTRIBUTION_SHEETS else 'EXPN'
+    for number in range(rows):
+        filer_id, filer_name = filers[number % len(filers)]
+        first, last = _person_or_org(rng)
+        city, zip_code = rng.choice(CITIES)
+        year = 2020 + number % 6
+        row = dict.fromkeys(columns, '')
+        row.update({
+            'Filer_ID': filer_id, 'Filer_NamL': filer_name, 'Report_Num': '000', 'Committee_Type': 'CTL',
+            'Rpt_Date': datetime.datetime(year, 7, 31), 'From_Date': datetime.datetime(year, 1, 1),
+            'Thru_Date': datetime.datetime(year, 6, 30), 'Elect_Date': None,
+            'Rec_Type': rec_type, 'Form_Type': form_type, 'Tran_ID': f"{form_type}-{number}",
+            'Entity_Cd': 'IND' if first else 'OTH',
+        })
+        if rec_type == 'RCPT':
+            amount = _amount(rng)
+            row.update({'Tran_NamF': first, 'Tran_NamL': last, 'Tran_City': city, 'Tran_State': 'CA',
+                'Tran_Zip4': zip_code, 'Tran_Date': _date(rng, year), 'Tran_Amt1': amount, 'Tran_Amt2': amount})
+        else:
+            row.update({'Payee_NamF': first, 'Payee_NamL': last, 'Payee_City': city, 'Payee_State': 'CA',
+                'Payee_Zip4': zip_code, 'Expn_Dscr': rng.choice(DESCRIPTIONS)})
+            if 'Amt_Paid' in row:
+                row['Amt_Paid'] = _amount(rng)
+            else:
+                row.update({'Expn_Date': _date(rng, year), 'Amount': _amount(rng)})
+        yield [row[column] for column in columns]
+
+def write_form460_xlsx(path, rows_per_sheet=1000, contribution_sheets=None, expenditure_sheets=None, filers=5, seed=0):
+    """
+    Writes a synthetic Form 460 workbook.
+
+    Args:
+        path (str): Where to write the .xlsx file.
+        rows_per_sheet (int): Data rows in each schedule sheet.
+        contribution_sheets (list): Contribution sheet names to fill (default: all of them).
+        expenditure_sheets (list): Expenditure sheet names to fill (default: all of them).
+        filers (int): Distinct committees the rows are spread over.
+        seed (int): Random seed.
+
+    Returns:
+        int: The number of schedule rows written.
+    """
+    rng = random.Random(seed)
+    filer_list = _filers(rng, filers)
+    contribution_sheets = CONTRIBUTION_SHEETS if contribution_sheets is None else contribution_sheets
+    expenditure_sheets = EXPENDITURE_SHEETS if expenditure_sheets is None else expenditure_sheets
+
+    workbook = openpyxl.Workbook(write_only=True)
+    written = 0
+    for sheet_name in list(contribution_sheets) + list(expenditure_sheets):
+        if sheet_name in CONTRIBUTION_SHEETS:
+            columns = CONTRIBUTION_COLUMNS
+        else:
+            columns = ACCRUED_EXPENSE_COLUMNS if sheet_name == 'F-Expenses' else EXPENDITURE_COLUMNS
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append(columns)
+        for row in _schedule_rows(rng, sheet_name, columns, rows_per_sheet, filer_list):
+            worksheet.append(row)
+        written += rows_per_sheet
+    for sheet_name, columns in OTHER_SHEETS.items():
+        workbook.create_sheet(sheet_name).append(columns)
+    workbook.save(path)
+    return written
+
+def _pdf_page_lines(rng, filer_name, schedule, rows, start):
+    """Returns the text lines of one PDF page holding `rows` records of one schedule."""
+    lines = ["NAME OF FILER", filer_name]
+    if schedule == 'A':
+        lines.append("SCHEDULE A - Monetary Contributions Received")
+    else:
+        lines.append("SCHEDULE E - Payments Made")
+    for number in range(start, start + rows):
+        first, last = _person_or_org(rng)
+        city, zip_code = rng.choice(CITIES)
+        date = _date(rng, 2020 + number % 6)
+        lines.append(f"{first} {last}".strip())
+        lines.append(f"{rng.randrange(100, 9999)} Main St {city} CA {zip_code}")
+        description = 'Contribution' if schedule == 'A' else rng.choice(DESCRIPTIONS)
+        lines.append(f"{date:%m/%d/%Y} {description} ${_amount(rng):,.2f}")
+    return lines
+
+def write_form460_pdf(path, pages=10, rows_per_page=15, image_only=False, dpi=150, seed=0):
+    """
+    Writes a synthetic Form 460 PDF. The first half of the pages are Schedule A
+    contributions and the rest Schedule E payments.
+
+    Args:
+        path (str): Where to write the .pdf file.
+        pages (int): Number of pages.
+        rows_per_page (int): Records per page (three lines each).
+        image_only (bool): Rasterize each page so there is no text layer, like a scan.
+        dpi (int): Resolution of the rasterized pages when image_only.
+        seed (int): Random seed.
+
+    Returns:
+        int: The number of records written.
+    """
+    rng = random.Random(seed)
+    _, filer_name = _filers(rng, 1)[0]
+    doc = fitz.open()
+    width, height = fitz.paper_size('letter')
+    margin = 36
+    for page_num in range(pages):
+        schedule = 'A' if page_num < max(pages // 2, 1) else 'E'
+        lines = _pdf_page_lines(rng, filer_name, schedule, rows_per_page, page_num * rows_per_page)
+        fontsize = min(10, (height - 2 * margin) / (len(lines) * 1.3))
+        page = doc.new_page(width=width, height=height)
+        page.insert_text((margin, margin + fontsize), "\n".join(lines), fontsize=fontsize, fontname='helv')
+        if image_only:
+            pixmap = page.get_pixmap(dpi=dpi)
+            doc.delete_page(page_num)
+            page = doc.new_page(pno=page_num, width=width, height=height)
+            page.insert_image(page.rect, pixmap=pixmap)
+    doc.save(path, deflate=True)
+    doc.close()
+    return pages * rows_per_page
+
+def _schedule_lines(rng, filer_name, schedule, rows):
+    """Returns the lines of one schedule section: its header, `rows` records and a subtotal."""
+    header = {'A': "Monetary Contributions Received", 'C': "Nonmonetary Contributions Received", 'E': "Payments Made"}[schedule]
+    lines = [rng.choice((f"SCHEDULE {schedule} - {header}", f"Schedule {schedule}  {header}", f"SCHEDULE {schedule}")),
+        "NAME OF FILER", filer_name]
+    total = 0.0
+    for _ in range(rows):
+        first, last = _person_or_org(rng)
+        city, zip_code = rng.choice(CITIES)
+        date = _date(rng, rng.randrange(2020, 2026))
+        amount = _amount(rng)
+        total += amount
+        lines.append(f"{first} {last}".strip())
+        lines.append(f"{rng.randrange(100, 9999)} Main St {city} CA {zip_code}")
+        if schedule == 'E':
+            lines.append(f"{rng.choice(DESCRIPTIONS)} {date:%m/%d/%Y} ${amount:,.2f}")
+        elif rng.random() < 0.3: # Amount received this period, then cumulative to date
+            lines.append(f"{date:%m/%d/%Y} ${amount:,.2f} ${amount * rng.randrange(1, 4):,.2f}")
+        else:
+            lines.append(f"{date:%m/%d/%Y} {'Fair market value' if schedule == 'C' else 'Contribution'} ${amount:,.2f}")
+    lines.append(f"SUBTOTAL ${total:,.2f}")
+    return lines
+
+def form460_page_texts(pages=20, rows_per_page=15, seed=0):
+    """
+    Generates the page texts of a Form 460 filing as the PDF text layer or OCR
+    would return them: a cover page with the filer, a summary page, then Schedule
+    A, C and E sections whose records run on over unlabeled continuation pages,
+    and sometimes across a page break. Pages end with a newline, with OCR's
+    trailing form feed, or with no newline at all. A few pages are blank, and a
+    few are split part way through a line, with a scrap of the line (possibly
+    empty) as a page of its own. In some filings the cover page comes after the
+    first schedule page, or is missing.
+
+    Args:
+        pages (int): Roughly how many schedule pages to generate.
+        rows_per_page (int): Records per schedule page (three lines each).
+        seed (int): Random seed.
+
+    Returns:
+        list: The text of each page.
+    """
+    rng = random.Random(seed)
+    _, filer_name = _filers(rng, 1)[0]
+    rows = pages * rows_per_page
+    contributions, nonmonetary = rows // 2, rows // 10
+    lines = []
+    for schedule, count in (('A', contributions), ('C', nonmonetary), ('E', rows - contributions - nonmonetary)):
+        lines.extend(_schedule_lines(rng, filer_name, schedule, count))
+
+    lines_per_page = rows_per_page * 3 + 3
+    page_lines = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)]
+    for number, body in enumerate(page_lines, 3):
+        body.append(f"Page {number} of {len(page_lines) + 2}")
+    cover = ["COVER PAGE", "Recipient Committee Campaign Statement", "Statement covers period",
+        "from 01/01/2024 through 06/30/2024", "NAME OF FILER", filer_name, f"I.D. NUMBER {rng.randrange(1400000, 1500000)}"]
+    summary = ["SUMMARY PAGE", f"1. Monetary Contributions Schedule A ${rng.uniform(1e3, 1e5):,.2f}",
+        f"11. Payments Made Schedule E ${rng.uniform(1e3, 1e5):,.2f}"]
+    placement = rng.random()
+    if placement < 0.1:
+        page_lines = [summary] + page_lines
+    elif placement < 0.2:
+        page_lines = [summary, page_lines[0], cover] + page_lines[1:]
+    else:
+        page_lines = [cover, summary] + page_lines
+
+    ending = rng.choice(("\n", "\n\x0c", "\n\n\x0c"))
+    texts = []
+    for body in page_lines:
+        text = "\n".join(body) + (ending if rng.random() < 0.95 else "")
+        if rng.random() < 0.05:
+            # A scan split mid-line: the page breaks part way through a line, and
+            # a scrap of the same line comes through as a page of its own
+            cut = rng.randrange(1, len(text))
+            line_end = text.find("\n", cut)
+            scrap_end = rng.randint(cut, line_end if line_end != -1 else len(text))
+            texts.extend((text[:cut], text[cut:scrap_end]))
+            text = text[scrap_end:]
+        texts.append(text)
+        if rng.random() < 0.03:
+            texts.append("")  # A page OCR returned no text for
+    return texts
+
+# Syllables for made-up surnames, so there are far more distinct people than LAST_NAMES allows
+ONSETS = ['B', 'C', 'D', 'F', 'G', 'H', 'J', 'K', 'L', 'M', 'N', 'P', 'R', 'S', 'T', 'V', 'W', 'Z',
+    'Br', 'Ch', 'Cl', 'Dr', 'Gr', 'Kr', 'Pl', 'Sh', 'St', 'Tr']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'ai', 'ou', 'ea']
+CODAS = ['', 'n', 'r', 'l', 's', 'm', 'rd', 'nt', 'ck', 'st', 'ng', 'tt', 'ld']
+BUSINESS_WORDS = ['Plumbing', 'Printing', 'Consulting', 'Catering', 'Signs', 'Media', 'Strategies', 'Properties',
+    'Builders', 'Realty', 'Holdings', 'Farms']
+
+def _surname(rng):
+    return ''.join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for _ in range(rng.choice((2, 2, 3)))).capitalize()
+
+def _misspell(rng, word):
+    """Returns word with one typo (substitution, deletion, doubling or transposition) after its first letter."""
+    if len(word) < 3:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    typo = rng.randrange(4)
+    if typo == 0:
+        return word[:i] + rng.choice('aeioulnrst') + word[i + 1:]
+    if typo == 1:
+        return word[:i] + word[i + 1:]
+    if typo == 2:
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def donor_names(count, identities=200000, seed=0):
+    """
+    Generates contributor names the way filings spell them: the same person as
+    'Maria Garcia', 'GARCIA, MARIA', 'Maria L. Garcia', 'Dr. Maria Garcia' or
+    'Maria Garcai', and organizations as 'Chandi Empire Inc' or, from workbooks
+    with no first name, 'nan Chandi Empire Inc'. A few identities account for
+    most of the names, as donors who give repeatedly do.
+
+    Args:
+        count (int): Names to generate.
+        identities (int): Distinct people and organizations behind them.
+        seed (int): Random seed.
+
+    Returns:
+        list: (name, identity number) pairs.
+    """
+    rng = random.Random(seed)
+    people = []
+    for _ in range(identities):
+        if rng.random() < 0.15:
+            people.append(('', f"{_surname(rng)} {rng.choice(BUSINESS_WORDS)}"))
+        else:
+            people.append((rng.choice(FIRST_NAMES + [_surname(rng) for _ in range(2)]), _surname(rng)))
+    names = []
+    for _ in range(count):
+        identity = int(identities * rng.random() ** 2) # Skewed towards repeat donors
+        first, last = people[identity]
+        variant = rng.random()
+        if variant < 0.6:
+            name = f"{first or rng.choice(('', 'nan'))} {last}"
+        elif variant < 0.7:
+            name = f"{last}, {first}".upper()
+        elif variant < 0.8 and first:
+            name = f"{first} {rng.choice('ABCDEFGHJKLMNPRSTW')}. {last}"
+        elif variant < 0.95:
+            words = f"{first} {last}".split()
+            i = rng.randrange(len(words))
+            words[i] = _misspell(rng, words[i])
+            name = ' '.join(words)
+        else:
+            name = rng.choice(('Dr. {} {}', '{} {} Jr.', '{} {} Inc.')).format(first, last)
+        names.append((name.strip().strip(',').strip(), identity))
+    return names
@@ -1,29 +1,50 @@
-import pandas as pd
-import pytesseract
-import fitz  # PyMuPDF
 import os
-import re
 import io
-from PIL import Image
+import itertools
+import hashlib
+import collections
+import time
+import gzip
+import pickle
+import zipfile
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from flask import current_app # Import current_app to access the logger
 
+import metrics
+import pdf_parser
+import schedules
+
 # --- Configuration ---
-# IMPORTANT: Tesseract OCR must be installed on your system for PDF processing.
+# The extraction libraries are imported by the functions that use them: pandas,
+# numpy and openpyxl for workbooks, PyMuPDF for PDFs, and pytesseract and PIL only
+# once a page without a text layer has to be OCR'd. Importing this module (as
+# app.py and the CLIs do) stays cheap.
+#
+# IMPORTANT: Tesseract OCR must be installed on your system to OCR scanned PDFs.
 # Download from: https://tesseract-ocr.github.io/tessdoc/Downloads.html
-# After installation, uncomment the line below and set the correct path to your tesseract.exe
-# Example for Windows:
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# If it isn't on the PATH, set TESSERACT_CMD to the executable, e.g. on Windows
+# TESSERACT_CMD=C:\Program Files\Tesseract-OCR\tesseract.exe
+TESSERACT_CMD = os.getenv('TESSERACT_CMD')
+
+# OCR text is cached per page under this directory, keyed by a hash of the page content
+OCR_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_cache')
+
+# Sheets extracted by default; see schedules.py for how each is read
+CONTRIBUTION_SHEETS = [name for name, schedule in schedules.SCHEDULES.items() if schedule.table == 'contributions']
+EXPENDITURE_SHEETS = [name for name, schedule in schedules.SCHEDULES.items() if schedule.table == 'expenditures']
 
 def extract_data_from_xlsx(file_path):
     """
     Extracts contribution and expenditure data from a Form 460 XLSX file.
+
+    Each sheet with a schedule definition (see schedules.py) is mapped to records
+    column by column.
     """
+    import pandas as pd
     current_app.logger.info(f"Processing XLSX file: {file_path}")
-    contributions = []
-    expenditures = []
-    
-    contribution_sheets = ['A-Contributions', 'C-Contributions', 'I-Contributions', 'F496P3-Contributions']
-    expenditure_sheets = ['F465P3-Expenditure', 'F461P5-Expenditure', 'D-Expenditure', 'G-Expenditure', 'E-Expenditure', 'F-Expenses']
+    data = {"contributions": [], "expenditures": []}
 
     try:
         xls = pd.ExcelFile(file_path)
@@ -36,8 +57,13 @@ def extract_data_from_xlsx(file_path):
 
     for sheet_name in xls.sheet_names:
         current_app.logger.info(f"Attempting to process sheet: {sheet_name}")
+        schedule = schedules.schedule_for(sheet_name)
+        if schedule is None:
+            current_app.logger.info(f"  Skipping unknown sheet: {sheet_name}")
+            continue
         try:
-            df = pd.read_excel(xls, sheet_name=sheet_name)
+            with metrics.timed('sheet_read', source=sheet_name):
+                df = pd.read_excel(xls, sheet_name=sheet_name)
             current_app.logger.debug(f"Successfully read sheet '{sheet_name}'.")
             
             # Normalize column names to lowercase for easier matching
@@ -48,207 +74,454 @@ def extract_data_from_xlsx(file_path):
                 current_app.logger.error(f"Error normalizing columns for sheet '{sheet_name}' in {file_path}: {e}", exc_info=True)
                 continue # Skip this sheet if columns can't be normalized
 
-            if sheet_name in contribution_sheets:
-                current_app.logger.info(f"  Processing contributions sheet: {sheet_name}")
-                for index, row in df.iterrows():
-                    try:
-                        filer_name = row.get('filer_naml', '')
-                        first_name = row.get('tran_namf', '')
-                        last_name = row.get('tran_naml', '')
-                        contribution_amount = row.get('tran_amt1')
-                        contribution_date = row.get('tran_date')
-
-                        contributor_name = f"{first_name} {last_name}".strip()
-                        
-                        current_app.logger.debug(f"    Row {index}: Filer='{filer_name}', Contributor='{contributor_name}', Amount='{contribution_amount}', Date='{contribution_date}'")
-
-                        if not contributor_name or pd.isna(contribution_amount):
-                            current_app.logger.debug(f"      Skipping row {index}: Missing contributor name or amount.")
-                            continue
-
-                        record = {
-                            "filer_name": filer_name,
-                            "contributor_name": contributor_name,
-                            "contribution_amount": float(contribution_amount) if pd.notna(contribution_amount) else 0.0,
-                            "contribution_date": str(contribution_date) if pd.notna(contribution_date) else None,
-                            "source_file": os.path.basename(file_path)
-                        }
-                        current_app.logger.debug(f"      Appending contribution record: {record}")
-                        contributions.append(record)
-                        current_app.logger.debug(f"      Finished processing row {index} for contributions.")
-                    except Exception as e:
-                        current_app.logger.error(f"Error processing row {index} in sheet '{sheet_name}' in {file_path}: {e}", exc_info=True)
-                        continue # Continue to next row if error occurs
-                current_app.logger.info(f"  Finished processing contributions sheet: {sheet_name}")
-
-            elif sheet_name in expenditure_sheets:
-                current_app.logger.info(f"  Processing expenditures sheet: {sheet_name}")
-                for index, row in df.iterrows():
-                    try:
-                        filer_name = row.get('filer_naml', '')
-                        payee_name_first = row.get('payee_namf', '')
-                        payee_name_last = row.get('payee_naml', '')
-                        
-                        # Handle different amount columns for expenditures
-                        expenditure_amount = row.get('amount') # Common for F461P5, D, G, E
-                        if pd.isna(expenditure_amount): # Fallback for F-Expenses
-                            expenditure_amount = row.get('amt_paid')
-
-                        # Handle different date columns for expenditures
-                        expenditure_date = row.get('expn_date') # Common for F461P5, D, G, E
-                        if pd.isna(expenditure_date): # Fallback for F-Expenses
-                            expenditure_date = row.get('rpt_date')
-
-                        expenditure_description = row.get('expn_dscr', '')
-                        if not expenditure_description: # Fallback for other description columns
-                            expenditure_description = row.get('tran_dscr', '')
-
-                        payee_name = f"{payee_name_first} {payee_name_last}".strip()
-
-                        current_app.logger.debug(f"      Extracted: Filer='{filer_name}', Payee='{payee_name}', Amount='{expenditure_amount}', Date='{expenditure_date}', Description='{expenditure_description}'")
-
-                        if not payee_name or pd.isna(expenditure_amount):
-                            current_app.logger.debug(f"      Skipping row {index}: Missing payee name or amount.")
-                            continue
-
-                        record = {
-                            "filer_name": filer_name,
-                            "payee_name": payee_name,
-                            "expenditure_amount": float(expenditure_amount) if pd.notna(expenditure_amount) else 0.0,
-                            "expenditure_date": str(expenditure_date) if pd.notna(expenditure_date) else None,
-                            "expenditure_description": expenditure_description,
-                            "source_file": os.path.basename(file_path)
-                        }
-                        current_app.logger.debug(f"      Appending expenditure record: {record}")
-                        expenditures.append(record)
-                        current_app.logger.debug(f"      Finished processing row {index} for expenditures.")
-                    except Exception as e:
-                        current_app.logger.error(f"Error processing row {index} in sheet '{sheet_name}' in {file_path}: {e}", exc_info=True)
-                        continue # Continue to next row if error occurs
-                current_app.logger.info(f"  Finished processing expenditures sheet: {sheet_name}")
-            else:
-                current_app.logger.info(f"  Skipping unknown sheet: {sheet_name}")
+            current_app.logger.info(f"  Processing {schedule.table} sheet: {sheet_name}")
+            with metrics.timed('normalize', source=sheet_name):
+                records = schedules.extractor_for(schedule, df.columns)(df, sheet_name, file_path)
+            metrics.count('rows_total', len(records), stage='extracted', source=sheet_name)
+            data[schedule.table].extend(records)
+            current_app.logger.info(f"  Finished processing {schedule.table} sheet: {sheet_name}")
 
         except Exception as e:
             current_app.logger.error(f"Error processing sheet '{sheet_name}' in {file_path}: {e}", exc_info=True) # exc_info=True to log traceback
 
-    current_app.logger.info(f"  Extracted {len(contributions)} contribution records and {len(expenditures)} expenditure records.")
-    return {"contributions": contributions, "expenditures": expenditures}
+    current_app.logger.info(f"  Extracted {len(data['contributions'])} contribution records and {len(data['expenditures'])} expenditure records.")
+    return data
+
+def _chunks(rows, size):
+    """Groups an iterator into lists of at most `size` items without materializing it."""
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+# Bump when extraction logic or the cache format changes so cached sheet results are not reused
+SHEET_CACHE_VERSION = 2
+
+def _workbook_digest(archive):
+    """Hashes the parts every sheet depends on: shared strings and styles (which make dates dates)."""
+    digest = hashlib.sha256(f"v{SHEET_CACHE_VERSION}".encode())
+    for name in ('xl/sharedStrings.xml', 'xl/styles.xml'):
+        if name in archive.namelist():
+            digest.update(archive.read(name))
+    return digest.hexdigest()
+
+def _sheet_cache_key(archive, workbook_digest, worksheet, schedule, file_path):
+    """
+    Keys a sheet's extracted records on its own XML, the workbook digest, its
+    schedule definition and the source filename (which is part of every record),
+    or None if it can't be keyed.
+    """
+    worksheet_path = getattr(worksheet, '_worksheet_path', None)
+    if not worksheet_path or worksheet_path not in archive.namelist():
+        return None
+    digest = hashlib.sha256(workbook_digest.encode())
+    digest.update(f"|{os.path.basename(file_path)}|{schedule.signature}|".encode())
+    digest.update(archive.read(worksheet_path))
+    return digest.hexdigest()
+
+def _sheet_cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], f"{key}.pickle.gz")
+
+def _read_sheet_cache(cache_dir, key):
+    """
+    Returns an iterator over the cached record batches of a sheet, one pickle per
+    batch in a gzip'd file. Raises FileNotFoundError right away on a cache miss.
+    """
+    f = gzip.open(_sheet_cache_path(cache_dir, key), 'rb')
+
+    def batches():
+        with f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+    return batches()
+
+def _cache_sheet(cache_dir, key, record_batches):
+    """
+    Passes record batches through while writing them to the sheet cache. The entry
+    only becomes visible once the whole sheet has been written.
 
-def extract_data_from_pdf(file_path):
+    Records are pickled, so cached values (e.g. a date in a text column) come back
+    exactly as extracted. If the cache can't be written the sheet is still
+    extracted in full, just not cached.
     """
-    Extracts data from a general Form 460 PDF file using OCR.
-    This version includes date extraction.
+    path = _sheet_cache_path(cache_dir, key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    f = None
+    try:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = gzip.open(tmp_path, 'wb')
+        except OSError as e:
+            current_app.logger.warning(f"  Not caching sheet records: {e}")
+        for records in record_batches:
+            if f:
+                try:
+                    pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception as e:
+                    current_app.logger.warning(f"  Not caching sheet records: {e}")
+                    f.close()
+                    f = None
+            yield records
+        if f:
+            f.close()
+            f = None
+            try:
+                os.replace(tmp_path, path)
+            except OSError as e:
+                current_app.logger.warning(f"  Not caching sheet records: {e}")
+    finally:
+        if f:
+            f.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _stream_sheet(worksheet, schedule, file_path, batch_size):
+    """Yields a sheet's records batch_size rows at a time."""
+    import numpy as np
+    import pandas as pd
+    sheet_name = worksheet.title
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(col).lower() for col in header]
+    sheet_records = schedules.extractor_for(schedule, columns)
+    # Match read_excel: empty strings are missing values and blank rows are dropped
+    rows = ([None if value == '' else value for value in row] for row in rows)
+    rows = (row for row in rows if any(value is not None for value in row))
+
+    chunks = _chunks(rows, batch_size)
+    while True:
+        with metrics.timed('sheet_read', source=sheet_name):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        try:
+            with metrics.timed('normalize', source=sheet_name):
+                df = pd.DataFrame.from_records(chunk, columns=columns)
+                for col in df.columns[df.dtypes == object]:
+                    df[col] = df[col].where(df[col].notna(), np.nan)
+                records = sheet_records(df, sheet_name, file_path)
+            metrics.count('rows_total', len(records), stage='extracted', source=sheet_name)
+            yield records
+        except Exception as e:
+            current_app.logger.error(f"Error processing a batch of sheet '{sheet_name}' in {file_path}: {e}", exc_info=True)
+
+def stream_data_from_xlsx(file_path, batch_size=5000):
     """
-    current_app.logger.info(f"Processing PDF file with OCR: {file_path}")
-    contributions = []
-    expenditures = []
-    filer_name = "Unknown Filer"
+    Streams contribution and expenditure data from a Form 460 XLSX file.
+
+    Sheets are read through a read-only openpyxl iterator, batch_size rows at a
+    time, and each chunk is yielded as a {"contributions": [...], "expenditures": [...]}
+    batch. Peak memory is bounded by the batch size rather than the workbook size.
 
+    Extracted records are cached per sheet under app.config['SHEET_CACHE_DIR'],
+    keyed by the sheet's content, so an amended workbook only re-extracts the
+    sheets that changed. Set it to None to disable the cache.
+    """
+    import openpyxl
+    current_app.logger.info(f"Streaming XLSX file: {file_path} (batch size {batch_size})")
+    cache_dir = current_app.config.get('SHEET_CACHE_DIR')
     try:
-        doc = fitz.open(file_path)
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        archive = zipfile.ZipFile(file_path) if cache_dir else None
+    except FileNotFoundError:
+        current_app.logger.error(f"Error: File not found at {file_path}")
+        return
     except Exception as e:
-        current_app.logger.error(f"Error opening PDF {file_path}: {e}")
-        return {"contributions": [], "expenditures": []}
-
-    # Regex to find amounts and dates
-    amount_regex = re.compile(r'[\$]?\s*(\d{1,3}(?:,\d{3})*\.\d{2})')
-    date_regex = re.compile(r'(\d{1,2}/\d{1,2}/\d{2,4})')
+        current_app.logger.error(f"Error opening XLSX file {file_path}: {e}")
+        return
 
-    full_text = ""
-    for page_num in range(doc.page_count):
-        page = doc.load_page(page_num)
-        try:
-            # Use a higher DPI for better OCR accuracy
-            pix = page.get_pixmap(dpi=300)
-            img_bytes = pix.tobytes("png")
-            full_text += pytesseract.image_to_string(Image.open(io.BytesIO(img_bytes)))
-        except Exception as ocr_error:
-            current_app.logger.error(f"Could not perform OCR on page {page_num + 1}: {ocr_error}")
-
-    doc.close()
-
-    lines = full_text.split('\n')
-    current_schedule = None
-    info_buffer = []
-
-    # First pass to find the filer name
-    for i, line in enumerate(lines):
-        if "NAME OF FILER" in line.upper():
-            # Look for the name on the next non-empty line
-            for next_line in lines[i+1:]:
-                if next_line.strip():
-                    filer_name = next_line.strip()
-                    current_app.logger.info(f"  Found Filer Name: {filer_name}")
-                    break
-            break
-
-    # Second pass for data extraction
-    for line in lines:
-        line_upper = line.upper()
-        if "SCHEDULE A" in line_upper or "SCHEDULE C" in line_upper:
-            current_schedule = 'CONTRIBUTION'
-            info_buffer = []
-            continue
-        if "SCHEDULE E" in line_upper:
-            current_schedule = 'EXPENDITURE'
-            info_buffer = []
-            continue
-        if "SUMMARY PAGE" in line_upper:
-            current_schedule = None
-            info_buffer = []
-            continue
+    try:
+        workbook_digest = _workbook_digest(archive) if archive else None
+        for worksheet in workbook.worksheets:
+            sheet_name = worksheet.title
+            schedule = schedules.schedule_for(sheet_name)
+            if schedule is None:
+                current_app.logger.info(f"  Skipping unknown sheet: {sheet_name}")
+                continue
+            key = schedule.table
+
+            cache_key = _sheet_cache_key(archive, workbook_digest, worksheet, schedule, file_path) if archive else None
+            record_batches = None
+            if cache_key:
+                try:
+                    record_batches = _read_sheet_cache(cache_dir, cache_key)
+                    current_app.logger.info(f"  Using cached {key} for sheet: {sheet_name}")
+                except OSError: # A miss, or a cache that can't be read
+                    record_batches = None
+            if record_batches is None:
+                current_app.logger.info(f"  Streaming {key} sheet: {sheet_name}")
+                record_batches = _stream_sheet(worksheet, schedule, file_path, batch_size)
+                if cache_key:
+                    record_batches = _cache_sheet(cache_dir, cache_key, record_batches)
+
+            extracted = 0
+            other = "expenditures" if key == "contributions" else "contributions"
+            for records in record_batches:
+                extracted += len(records)
+                yield {key: records, other: []}
+            current_app.logger.info(f"  Finished {sheet_name}: {extracted} {key} records.")
+    finally:
+        workbook.close()
+        if archive:
+            archive.close()
+
+OCR_DPI = 300 # Use a higher DPI for better OCR accuracy
+TEXT_LAYER_MIN_CHARS = 20 # Fewer non-whitespace characters than this means an image-only page
+
+def _init_ocr_worker():
+    # Each worker already owns a core; stop tesseract from spawning its own threads
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+def _tesseract():
+    """Imports pytesseract, pointed at TESSERACT_CMD when it is set."""
+    import pytesseract
+    if TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
+def _ocr_page(file_path, page_num):
+    """
+    Renders one PDF page and OCRs it, returning (text, seconds). Runs inside pool
+    workers, so it opens its own document handle and must not touch current_app.
+    """
+    import fitz  # PyMuPDF
+    from PIL import Image
+    start = time.perf_counter()
+    with fitz.open(file_path) as doc:
+        pix = doc.load_page(page_num).get_pixmap(dpi=OCR_DPI)
+        img_bytes = pix.tobytes("png")
+    text = _tesseract().image_to_string(Image.open(io.BytesIO(img_bytes)))
+    return text, time.perf_counter() - start
+
+def _has_text_layer(text):
+    """A page has a usable text layer if it carries a meaningful amount of text."""
+    return sum(not char.isspace() for char in text) >= TEXT_LAYER_MIN_CHARS
+
+def _page_fingerprint(doc, page):
+    """
+    Hashes what a page renders from: its content stream, embedded images and
+    geometry. Identical pages in a re-uploaded or amended filing share a key.
+    """
+    digest = hashlib.sha256(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b'')
+    digest.update(f"{page.rect}|{page.rotation}|{OCR_DPI}".encode())
+    return digest.hexdigest()
 
-        if not current_schedule:
-            continue
+def _ocr_cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], f"{key}.txt")
 
-        # Check if the line contains a final amount, indicating end of a record
-        match = amount_regex.search(line)
-        if match:
-            amount = float(match.group(1).replace(',', ''))
-            
-            # Combine the buffer and current line to find all info
-            full_record_text = " ".join(info_buffer) + " " + line
-            
-            # Find date
-            date_match = date_regex.search(full_record_text)
-            found_date = date_match.group(1) if date_match else None
+def _read_ocr_cache(cache_dir, key):
+    try:
+        with open(_ocr_cache_path(cache_dir, key), encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
 
-            # The rest of the line is the description
-            description = amount_regex.sub('', line).strip()
+def _write_ocr_cache(cache_dir, key, text):
+    path = _ocr_cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path) # Atomic, so concurrent uploads never read a partial file
 
-            if not info_buffer:
+def _iter_page_texts(file_path, report, on_page=None):
+    """
+    Yields (page number, text) for each page of a PDF in page order, each as soon
+    as it and the pages before it are available, so parsing can keep pace with OCR.
+
+    Pages with a usable text layer are read directly with PyMuPDF. Only image-only
+    pages are OCR'd: those already seen (by content hash) come from the OCR cache,
+    the rest are rendered and OCR'd across a process pool of app.config['OCR_WORKERS']
+    workers (default: one per CPU). Set app.config['OCR_CACHE_DIR'] to None to
+    disable the cache. Pages that fail OCR come back as empty strings.
+
+    A report entry is appended to report for each page, recording the page number,
+    the path taken ('text', 'cache', 'ocr' or 'failed') and the seconds it took.
+    If given, on_page(pages_done, pages_total) is called as pages complete.
+    """
+    import fitz  # PyMuPDF
+    workers = current_app.config.get('OCR_WORKERS') or os.cpu_count() or 1
+    cache_dir = current_app.config.get('OCR_CACHE_DIR', OCR_CACHE_DIR)
+
+    page_texts = []
+    keys = {}
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            start = time.perf_counter()
+            text = page.get_text()
+            if _has_text_layer(text):
+                page_texts.append(text)
+                report.append({"page": page.number + 1, "method": "text", "seconds": time.perf_counter() - start})
                 continue
+            keys[page.number] = _page_fingerprint(doc, page)
+            text = _read_ocr_cache(cache_dir, keys[page.number]) if cache_dir else None
+            page_texts.append(text)
+            report.append({"page": page.number + 1, "method": "cache", "seconds": time.perf_counter() - start})
+
+    pending = [page_num for page_num, text in enumerate(page_texts) if text is None]
+    pages_done = len(page_texts) - len(pending)
+    if on_page:
+        on_page(pages_done, len(page_texts))
+    if keys:
+        current_app.logger.info(f"  {len(keys) - len(pending)} of {len(keys)} image-only pages found in OCR cache; OCR'ing {len(pending)} with {min(workers, max(len(pending), 1))} worker(s).")
+
+    def page_finished():
+        nonlocal pages_done
+        pages_done += 1
+        if on_page:
+            on_page(pages_done, len(page_texts))
+
+    def store(page_num, result):
+        page_texts[page_num], seconds = result
+        report[page_num].update(method="ocr", seconds=report[page_num]["seconds"] + seconds)
+        if cache_dir:
+            _write_ocr_cache(cache_dir, keys[page_num], page_texts[page_num])
+        page_finished()
+
+    def fail(page_num, ocr_error):
+        current_app.logger.error(f"Could not perform OCR on page {page_num + 1}: {ocr_error}")
+        page_texts[page_num] = ""
+        report[page_num]["method"] = "failed"
+        page_finished()
+
+    debug = current_app.logger.isEnabledFor(logging.DEBUG)
+    def page_ready(page_num):
+        entry = report[page_num]
+        metrics.count('pdf_pages_total', method=entry['method'])
+        metrics.observe('stage_seconds', entry['seconds'], stage='pdf_page', source=entry['method'])
+        if debug:
+            current_app.logger.debug(f"    Page {entry['page']}: {entry['method']} in {entry['seconds'] * 1000:.1f} ms")
+        return page_num + 1, page_texts[page_num]
+
+    if workers <= 1 or len(pending) <= 1:
+        for page_num, text in enumerate(page_texts):
+            if text is None:
+                try:
+                    store(page_num, _ocr_page(file_path, page_num))
+                except Exception as ocr_error:
+                    fail(page_num, ocr_error)
+            yield page_ready(page_num)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_ocr_worker) as executor:
+            futures = {page_num: executor.submit(_ocr_page, file_path, page_num) for page_num in pending}
+            try:
+                for page_num in range(len(page_texts)):
+                    if page_num in futures:
+                        try:
+                            store(page_num, futures[page_num].result())
+                        except Exception as ocr_error:
+                            fail(page_num, ocr_error)
+                    yield page_ready(page_num)
+            finally:
+                for future in futures.values(): # The caller stopped early; don't OCR the rest
+                    future.cancel()
+
+def _extract_page_texts(file_path, on_page=None):
+    """Returns (page texts in page order, per-page report) for a PDF. See _iter_page_texts."""
+    report = []
+    page_texts = [text for _, text in _iter_page_texts(file_path, report, on_page)]
+    return page_texts, report
+
+def _parse_pdf_pages(file_path, report, on_page=None):
+    """
+    Yields {"contributions": [...], "expenditures": [...]} with the records each
+    page of a PDF completes, parsing every page as soon as its text is available
+    (see pdf_parser.RecordParser). Fills report as _iter_page_texts does.
+    """
+    current_app.logger.info(f"Processing PDF file: {file_path}")
+    parser = pdf_parser.RecordParser(file_path)
+    extracted = collections.Counter()
 
-            name = info_buffer[0]
-
-            record = {
-                "filer_name": filer_name,
-                "contribution_amount": amount if current_schedule == 'CONTRIBUTION' else None,
-                "expenditure_amount": amount if current_schedule == 'EXPENDITURE' else None,
-                "contributor_name": name if current_schedule == 'CONTRIBUTION' else None,
-                "payee_name": name if current_schedule == 'EXPENDITURE' else None,
-                "expenditure_description": description,
-                "contribution_date": found_date if current_schedule == 'CONTRIBUTION' else None,
-                "expenditure_date": found_date if current_schedule == 'EXPENDITURE' else None,
-                "source_file": os.path.basename(file_path)
-            }
-            
-            record = {k: v for k, v in record.items() if v is not None}
+    def parsed(records):
+        for table, rows in records.items():
+            extracted[table] += len(rows)
+        metrics.count('rows_total', len(records['contributions']) + len(records['expenditures']), stage='extracted', source='pdf')
+        return records
 
-            if current_schedule == 'CONTRIBUTION':
-                contributions.append(record)
-            elif current_schedule == 'EXPENDITURE':
-                expenditures.append(record)
-            
-            info_buffer = [] # Reset for the next record
-        else:
-            # If it's not an amount line, add its text to the buffer
-            if line.strip():
-                info_buffer.append(line.strip())
-
-    current_app.logger.info(f"  Extracted {len(contributions)} contributions and {len(expenditures)} expenditures from PDF.")
-    return {"contributions": contributions, "expenditures": expenditures}
+    try:
+        for page_number, text in _iter_page_texts(file_path, report, on_page):
+            with metrics.timed('normalize', source='pdf'):
+                records = parser.feed(page_number, text)
+            yield parsed(records)
+    except Exception as e:
+        current_app.logger.error(f"Error reading PDF {file_path}: {e}")
+        return
+    with metrics.timed('normalize', source='pdf'):
+        records = parser.close()
+    yield parsed(records)
+
+    if parser.filer_name:
+        current_app.logger.info(f"  Found Filer Name: {parser.filer_name}")
+    methods = collections.Counter(entry["method"] for entry in report)
+    current_app.logger.info(f"  Extracted {extracted['contributions']} contributions and {extracted['expenditures']} expenditures from PDF (pages by method: {dict(methods)}).")
+
+def extract_data_from_pdf(file_path, on_page=None):
+    """
+    Extracts data from a general Form 460 PDF file, reading the text layer where
+    there is one and OCR'ing image-only pages. This version includes date extraction.
+    Each record carries the page and line it starts on, and the result also carries
+    a per-page "pages" report of the path taken and timings.
+    on_page(pages_done, pages_total) is called as pages complete, if given.
+    """
+    data = {"contributions": [], "expenditures": []}
+    report = []
+    for records in _parse_pdf_pages(file_path, report, on_page):
+        for table, rows in records.items():
+            data[table].extend(rows)
+    data["pages"] = report
+    return data
+
+def stream_data_from_pdf(file_path, batch_size=5000, on_page=None, report=None):
+    """
+    Streams contribution and expenditure data from a Form 460 PDF file in
+    {"contributions": [...], "expenditures": [...]} batches of about batch_size
+    records. Pages are parsed as their text arrives, so a batch is ready as soon
+    as the pages it comes from are OCR'd, and only one batch is held in memory.
+    on_page(pages_done, pages_total) is called as pages complete, if given.
+    If report is a list, the per-page report extract_data_from_pdf returns as
+    "pages" is appended to it as pages are read.
+    """
+    batch = {"contributions": [], "expenditures": []}
+    size = 0
+    for records in _parse_pdf_pages(file_path, report if report is not None else [], on_page):
+        for table, rows in records.items():
+            batch[table].extend(rows)
+            size += len(rows)
+        if size >= batch_size:
+            yield batch
+            batch = {"contributions": [], "expenditures": []}
+            size = 0
+    if size:
+        yield batch
+
+def stream_uploaded_file(file_path, batch_size=5000, on_page=None, report=None):
+    """
+    Streaming counterpart of process_uploaded_file: returns an iterator of record
+    batches for insert_batches, or None for unsupported file types. PDFs report
+    progress through on_page(pages_done, pages_total), and fill report (a list,
+    if given) with how each page was read; see stream_data_from_pdf.
+
+    Extraction happens as the batches are pulled, which for a scanned PDF means
+    OCR. Spool them (spool.write_spool) before passing them to insert_batches,
+    which holds the write lock while it pulls batches.
+    """
+    _, file_extension = os.path.splitext(file_path)
+
+    if file_extension.lower() == '.xlsx':
+        return stream_data_from_xlsx(file_path, batch_size)
+    elif file_extension.lower() == '.pdf':
+        return stream_data_from_pdf(file_path, batch_size, on_page, report)
+    else:
+        current_app.logger.warning(f"Unsupported file type: {file_extension}")
+        return None
 
 def process_uploaded_file(file_path):
     current_app.logger.debug(f"[DEBUG] Entering process_uploaded_file for: {file_path}")
@@ -1,10 +1,40 @@
+import time
+import threading
 import sqlalchemy
-from sqlalchemy import create_engine, Table, Column, Integer, String, Float, MetaData
+from sqlalchemy import func, Table, Column, Integer, BigInteger, String, Float, Date, MetaData, Index
 
-DB_NAME = 'campaign_finance.db'
-ENGINE = create_engine(f'sqlite:///{DB_NAME}')
+import metrics
+import analytics
+import normalize
+import entities
+from engine import create_engines
+
+# ENGINE is the single serialized writer connection; READ_ENGINE is the pool of
+# read-only connections every query should use. See engine.py for configuration.
+ENGINE, READ_ENGINE = create_engines()
+DB_NAME = ENGINE.url.database
 METADATA = MetaData()
 
+# The schema also runs on PostgreSQL, which needs a few statements of its own.
+# Only the configured dialect's module is imported.
+POSTGRESQL = ENGINE.dialect.name == 'postgresql'
+if POSTGRESQL:
+    from sqlalchemy.dialects.postgresql import insert
+else:
+    from sqlalchemy.dialects.sqlite import insert
+
+# Rows per executemany() call when bulk loading
+INSERT_BATCH_SIZE = 1000
+
+# Rows read back per chunk when copying loaded rows to the Parquet store
+ANALYTICS_EXPORT_CHUNK_SIZE = 50000
+
+# SQLite allows one writer at a time; threads in this process queue here for the
+# writer connection rather than failing with 'database is locked' while another
+# file's load is in progress. Across processes, write transactions take the
+# database's write lock as they begin (see engine.py).
+WRITE_LOCK = threading.Lock()
+
 # Define the table structures
 contributions_table = Table('contributions',
     METADATA,
@@ -13,7 +43,12 @@ contributions_table = Table('contributions',
     Column('contributor_name', String),
     Column('contribution_amount', Float),
     Column('contribution_date', String),
-    Column('source_file', String)
+    Column('source_file', String),
+    # Typed copies of the date and amount, filled by _load (see normalize.py)
+    Column('contribution_day', Date),
+    Column('contribution_cents', BigInteger),
+    # The resolved contributor, filled by _load (see entities.py)
+    Column('entity_id', Integer)
 )
 
 expenditures_table = Table('expenditures',
@@ -24,26 +59,615 @@ expenditures_table = Table('expenditures',
     Column('expenditure_amount', Float),
     Column('expenditure_date', String),
     Column('expenditure_description', String),
-    Column('source_file', String)
+    Column('source_file', String),
+    Column('expenditure_day', Date),
+    Column('expenditure_cents', BigInteger),
+    Column('entity_id', Integer)
+)
+
+# Natural keys that make re-ingesting a file idempotent
+NATURAL_KEYS = {
+    'contributions': ('source_file', 'filer_name', 'contributor_name', 'contribution_amount', 'contribution_date'),
+    'expenditures': ('source_file', 'filer_name', 'payee_name', 'expenditure_amount', 'expenditure_date'),
+}
+
+def _natural_key(table):
+    """
+    The natural key expressions. SQLite treats NULLs as distinct in unique indexes,
+    so they are folded to ''; PostgreSQL (15+) compares them with NULLS NOT DISTINCT.
+    """
+    columns = [table.c[name] for name in NATURAL_KEYS[table.name]]
+    return columns if POSTGRESQL else [func.ifnull(column, '') for column in columns]
+
+natural_key_indexes = [
+    Index(f'uq_{table.name}_natural_key', *_natural_key(table), unique=True, **({'postgresql_nulls_not_distinct': True} if POSTGRESQL else {}))
+    for table in (contributions_table, expenditures_table)
+]
+
+# Raw date/amount column -> typed column it is parsed into
+TYPED_COLUMNS = {
+    'contributions': {'contribution_date': 'contribution_day', 'contribution_amount': 'contribution_cents'},
+    'expenditures': {'expenditure_date': 'expenditure_day', 'expenditure_amount': 'expenditure_cents'},
+}
+
+# B-tree indexes for the amount and date range filters (and date ordering) on the search page
+range_indexes = [
+    Index(f'ix_{table.name}_{column}', table.c[column])
+    for table, columns in (
+        (contributions_table, ('contribution_cents', 'contribution_day')),
+        (expenditures_table, ('expenditure_cents', 'expenditure_day')),
+    )
+    for column in columns
+]
+
+entity_indexes = [Index(f'ix_{table.name}_entity_id', table.c.entity_id) for table in (contributions_table, expenditures_table)]
+
+# Indexes on the raw columns from before the typed ones; dropped on upgrade
+OBSOLETE_INDEXES = ['ix_contributions_contribution_amount', 'ix_contributions_contribution_date',
+    'ix_expenditures_expenditure_amount', 'ix_expenditures_expenditure_date']
+
+# Full-text search over the name/description columns. The trigram tokenizer lets
+# FTS5 answer the search page's LIKE '%term%' filters from the index (for terms of
+# three or more characters) with the same case-insensitive substring semantics.
+FTS_COLUMNS = {
+    'contributions': ('filer_name', 'contributor_name'),
+    'expenditures': ('filer_name', 'payee_name', 'expenditure_description'),
+}
+
+def _trigram_ddl(table_name):
+    """PostgreSQL's counterpart of _fts_ddl: pg_trgm indexes that answer ILIKE '%term%'."""
+    return ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{column}_trgm ON {table_name} USING gin ({column} gin_trgm_ops)"
+        for column in FTS_COLUMNS[table_name]
+    ]
+
+def _fts_ddl(table_name):
+    """Returns the statements creating a table's FTS5 index and the triggers keeping it in sync."""
+    fts = f"{table_name}_fts"
+    columns = ', '.join(FTS_COLUMNS[table_name])
+    new_values = ', '.join(f"new.{column}" for column in FTS_COLUMNS[table_name])
+    old_values = ', '.join(f"old.{column}" for column in FTS_COLUMNS[table_name])
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table_name}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')", # Index rows that predate the FTS table
+    ]
+
+# --- Entity resolution ---
+# Every distinct contributor/payee spelling gets a row in entity_names pointing
+# at its entity. Spellings are matched once, when first loaded, so entity_ids
+# never change and a load only looks up its own names.
+entities_table = Table('entities',
+    METADATA,
+    Column('id', Integer, primary_key=True),
+    Column('name', String) # The first spelling seen, used as the display name
+)
+
+entity_names_table = Table('entity_names',
+    METADATA,
+    Column('name_key', String, primary_key=True), # entities.normalize_name()
+    Column('entity_id', Integer, nullable=False),
+    # Blocking keys (entities.block_keys()) for finding match candidates. Only set
+    # on the spelling each entity was created from: new spellings are compared with
+    # that one alone, so matches can't chain ('Joan' ~ 'Jon' ~ 'John').
+    Column('phonetic_key', String),
+    Column('prefix_key', String),
+    Index('ix_entity_names_phonetic_key', 'phonetic_key'),
+    Index('ix_entity_names_prefix_key', 'prefix_key')
+)
+
+# Contributor/payee column of each table that entity_id resolves
+ENTITY_COLUMNS = {'contributions': 'contributor_name', 'expenditures': 'payee_name'}
+
+# entity_names columns holding each of entities.block_keys()
+BLOCK_COLUMNS = ('phonetic_key', 'prefix_key')
+
+# Keys per IN (...) lookup, well under SQLite's bound parameter limit
+ENTITY_LOOKUP_CHUNK_SIZE = 500
+
+def _lookup(connection, column, values):
+    """Returns the entity_names rows whose column is one of values."""
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), ENTITY_LOOKUP_CHUNK_SIZE):
+        rows.extend(connection.execute(sqlalchemy.select(entity_names_table).where(
+            entity_names_table.c[column].in_(values[start:start + ENTITY_LOOKUP_CHUNK_SIZE]))))
+    return rows
+
+def resolve_entities(connection, names):
+    """
+    Assigns entity_ids to names, matching new spellings against the known ones
+    and creating entities for those with no match. Must run in the loading
+    transaction, so the entities commit (or roll back) with the rows using them,
+    and that transaction must hold the write lock from its start (as the writer
+    engine's do), so no other process adds the same spellings meanwhile.
+    Costs O(len(names)) index lookups however many names are already known.
+
+    Args:
+        connection: A connection with an open write transaction.
+        names (iterable): Contributor or payee names, as extracted.
+
+    Returns:
+        dict: name -> entity_id (None for missing or empty names).
+    """
+    keys = {name: entities.normalize_name(name) for name in names} # Deduplicated in order of appearance
+    known = {row.name_key: row.entity_id for row in _lookup(connection, 'name_key', {key for key in keys.values() if key})}
+    new_keys = {} # Unknown key -> its first spelling
+    for name, key in keys.items():
+        if key and key not in known:
+            new_keys.setdefault(key, name)
+    if new_keys:
+        blocked = {key: dict(zip(BLOCK_COLUMNS, entities.block_keys(key))) for key in new_keys}
+        blocks = {column: {} for column in BLOCK_COLUMNS} # column -> block key -> [(name_key, entity_id)]
+        for column, column_blocks in blocks.items():
+            for row in _lookup(connection, column, {block_key[column] for block_key in blocked.values()}):
+                column_blocks.setdefault(row._mapping[column], []).append((row.name_key, row.entity_id))
+        created = [] # Spellings of the new entities; -1 - position stands in for their ids
+        founding = set() # Keys the new entities are created from
+        for key, name in new_keys.items():
+            candidates = [candidate for column, column_blocks in blocks.items() for candidate in column_blocks.get(blocked[key][column], [])]
+            match = entities.best_match(key, candidates)
+            if match is None:
+                created.append(entities.display_name(name))
+                founding.add(key)
+                match = -len(created)
+            known[key] = match
+            if key in founding:
+                for column, column_blocks in blocks.items(): # Later names in this batch can match it too
+                    column_blocks.setdefault(blocked[key][column], []).append((key, match))
+        ids = []
+        if created:
+            ids = connection.execute(insert(entities_table).returning(entities_table.c.id, sort_by_parameter_order=True),
+                [{'name': name} for name in created]).scalars().all()
+        for key in new_keys:
+            if known[key] < 0:
+                known[key] = ids[-1 - known[key]]
+        connection.execute(insert(entity_names_table), [
+            dict(blocked[key] if key in founding else dict.fromkeys(BLOCK_COLUMNS), name_key=key, entity_id=known[key])
+            for key in new_keys
+        ])
+    return {name: known.get(key) for name, key in keys.items()}
+
+# --- Rollups ---
+# Summary tables kept up to date by insert_batches, so dashboard queries cost
+# O(groups) instead of scanning every contribution/expenditure.
+rollup_filer_periods_table = Table('rollup_filer_periods',
+    METADATA,
+    Column('kind', String, primary_key=True), # 'contributions' or 'expenditures'
+    Column('filer_name', String, primary_key=True),
+    Column('period', String, primary_key=True), # 'YYYY-MM', or 'unknown' for unparseable dates
+    Column('total', Float), # total_cents / 100, for readers
+    Column('count', Integer),
+    Column('total_cents', BigInteger)
+)
+
+rollup_entities_table = Table('rollup_entities',
+    METADATA,
+    Column('kind', String, primary_key=True), # 'contributor' or 'payee'
+    Column('name', String, primary_key=True),
+    Column('total', Float),
+    Column('count', Integer),
+    Column('total_cents', BigInteger),
+    Index('ix_rollup_entities_kind_total', 'kind', 'total')
+)
+
+# (kind, source table, entity kind, entity column, cents column, day column)
+ROLLUP_SOURCES = [
+    ('contributions', 'contributions', 'contributor', 'contributor_name', 'contribution_cents', 'contribution_day'),
+    ('expenditures', 'expenditures', 'payee', 'payee_name', 'expenditure_cents', 'expenditure_day'),
+]
+
+def _update_rollups(connection, id_ranges):
+    """
+    Folds the rows with ids in id_ranges[table] (inclusive (first, last) pairs)
+    into the rollup tables. Called inside the loading transaction, so the rollups
+    commit together with the data.
+    """
+    for kind, table, entity_kind, entity_column, cents_column, day_column in ROLLUP_SOURCES:
+        for first_id, last_id in id_ranges.get(table, ()):
+            params = {'kind': kind, 'entity_kind': entity_kind, 'first_id': first_id, 'last_id': last_id}
+            # Sums are kept in integer cents so they stay exact however many loads are folded in
+            cents = f"sum(coalesce({cents_column}, 0))"
+            connection.execute(sqlalchemy.text(
+                f"INSERT INTO rollup_filer_periods (kind, filer_name, period, total_cents, total, count) "
+                f"SELECT :kind, coalesce(filer_name, ''), coalesce(substr(CAST({day_column} AS VARCHAR), 1, 7), 'unknown'), "
+                f"{cents}, {cents} / 100.0, count(*) "
+                f"FROM {table} WHERE id BETWEEN :first_id AND :last_id GROUP BY 2, 3 "
+                f"ON CONFLICT (kind, filer_name, period) DO UPDATE SET "
+                f"total_cents = rollup_filer_periods.total_cents + excluded.total_cents, "
+                f"total = (rollup_filer_periods.total_cents + excluded.total_cents) / 100.0, "
+                f"count = rollup_filer_periods.count + excluded.count"
+            ), params)
+            # Totals are per resolved entity, under its display name
+            connection.execute(sqlalchemy.text(
+                f"INSERT INTO rollup_entities (kind, name, total_cents, total, count) "
+                f"SELECT :entity_kind, coalesce(entities.name, {entity_column}, ''), {cents}, {cents} / 100.0, count(*) "
+                f"FROM {table} LEFT JOIN entities ON entities.id = {table}.entity_id WHERE {table}.id BETWEEN :first_id AND :last_id GROUP BY 2 "
+                f"ON CONFLICT (kind, name) DO UPDATE SET "
+                f"total_cents = rollup_entities.total_cents + excluded.total_cents, "
+                f"total = (rollup_entities.total_cents + excluded.total_cents) / 100.0, "
+                f"count = rollup_entities.count + excluded.count"
+            ), params)
+
+def rebuild_rollups(connection=None):
+    """
+    Recomputes the rollup tables from scratch. Only needed after rows are deleted
+    or edited outside insert_batches.
+    """
+    if connection is None:
+        with WRITE_LOCK, ENGINE.begin() as connection:
+            return rebuild_rollups(connection)
+    connection.execute(rollup_filer_periods_table.delete())
+    connection.execute(rollup_entities_table.delete())
+    _update_rollups(connection, {table: [(1, max_id)] for table, max_id in _max_ids(connection).items() if max_id})
+
+def _max_ids(connection):
+    return {
+        table.name: connection.execute(sqlalchemy.select(func.coalesce(func.max(table.c.id), 0))).scalar()
+        for table in (contributions_table, expenditures_table)
+    }
+
+def _add_id_ranges(id_ranges, ids):
+    """Adds ids to a list of inclusive [first, last] runs of consecutive ids."""
+    for row_id in sorted(ids):
+        if id_ranges and id_ranges[-1][1] + 1 == row_id:
+            id_ranges[-1][1] = row_id
+        else:
+            id_ranges.append([row_id, row_id])
+
+def filer_totals(kind, filer_name=None, by_period=False):
+    """
+    Returns contribution or expenditure totals per filer (and per month if
+    by_period) from the rollups, optionally for filers whose name contains filer_name.
+    """
+    columns = "filer_name, period, total, count" if by_period else "filer_name, sum(total_cents) / 100.0 AS total, sum(count) AS count"
+    query = f"SELECT {columns} FROM rollup_filer_periods WHERE kind = :kind"
+    params = {'kind': kind}
+    if filer_name:
+        query += f" AND filer_name {'ILIKE' if POSTGRESQL else 'LIKE'} :filer_name"
+        params['filer_name'] = f'%{filer_name}%'
+    query += " ORDER BY filer_name, period" if by_period else " GROUP BY filer_name ORDER BY total DESC"
+    with READ_ENGINE.connect() as connection:
+        return [dict(row._mapping) for row in connection.execute(sqlalchemy.text(query), params)]
+
+def top_entities(kind, limit=10):
+    """Returns the top contributors or payees (kind 'contributor'/'payee') by total amount, per resolved entity."""
+    with READ_ENGINE.connect() as connection:
+        rows = connection.execute(
+            sqlalchemy.select(rollup_entities_table.c.name, rollup_entities_table.c.total, rollup_entities_table.c.count)
+            .where(rollup_entities_table.c.kind == kind)
+            .order_by(rollup_entities_table.c.total.desc())
+            .limit(limit)
+        )
+        return [dict(row._mapping) for row in rows]
+
+# --- Analytics store ---
+
+def _export_to_analytics(id_ranges):
+    """
+    Appends the rows with ids in id_ranges[table] (inclusive (first, last) pairs)
+    to the Parquet store in analytics.py. Runs after the load has committed and reads through its
+    own connection, so it never holds the write lock. Failures are logged rather
+    than raised: the database remains the source of truth, and rebuild_analytics()
+    restores anything missed.
+    """
+    # A separate read URL may be a replica that hasn't caught up with the load yet
+    source = READ_ENGINE if READ_ENGINE.url == ENGINE.url else ENGINE
+    exported = {}
+    for table in (contributions_table, expenditures_table):
+        ranges = id_ranges.get(table.name)
+        if not ranges:
+            continue
+        try:
+            with metrics.timed('analytics_export', source=table.name), source.connect() as connection:
+                exported[table.name] = 0
+                for first_id, last_id in ranges:
+                    result = connection.execution_options(yield_per=ANALYTICS_EXPORT_CHUNK_SIZE).execute(
+                        sqlalchemy.select(table).where(table.c.id.between(first_id, last_id)).order_by(table.c.id))
+                    for rows in result.partitions():
+                        exported[table.name] += analytics.append(table.name, [dict(row._mapping) for row in rows])
+        except Exception as e:
+            print(f"Error exporting {table.name} rows {ranges[0][0]}-{ranges[-1][1]} to the analytics store: {e}")
+    return exported
+
+def rebuild_analytics():
+    """Rewrites the Parquet store from the database, e.g. to compact it after many small loads."""
+    analytics.clear()
+    with READ_ENGINE.connect() as connection:
+        upto_ids = _max_ids(connection)
+    exported = _export_to_analytics({table: [(1, max_id)] for table, max_id in upto_ids.items() if max_id})
+    print(f"Exported {', '.join(f'{count} {table}' for table, count in exported.items()) or 'no rows'} to the analytics store.")
+
+# --- Data generation ---
+# A counter bumped in the same transaction as every load that inserts rows. Query
+# result caches key on it, so cached pages go stale exactly when new data is
+# committed, whichever process committed it.
+data_generation_table = Table('data_generation',
+    METADATA,
+    Column('id', Integer, primary_key=True), # Always 1
+    Column('generation', Integer)
+)
+
+def data_generation(connection=None):
+    """Returns the current data generation."""
+    if connection is None:
+        with READ_ENGINE.connect() as connection:
+            return data_generation(connection)
+    return connection.execute(sqlalchemy.select(data_generation_table.c.generation).where(data_generation_table.c.id == 1)).scalar() or 0
+
+def _bump_data_generation(connection):
+    connection.execute(insert(data_generation_table).values(id=1, generation=1)
+        .on_conflict_do_update(index_elements=['id'], set_={'generation': data_generation_table.c.generation + 1}))
+
+# --- Ingested files ---
+# One row per upload (by SHA-256 of its bytes) that has been fully loaded, so
+# identical re-uploads can be skipped before any extraction work is done.
+ingested_files_table = Table('ingested_files',
+    METADATA,
+    Column('sha256', String, primary_key=True),
+    Column('filename', String),
+    Column('contributions', Integer),
+    Column('expenditures', Integer),
+    Column('ingested_at', Float)
 )
 
+def is_ingested(sha256):
+    """Returns True if a file with this content hash has already been loaded."""
+    with READ_ENGINE.connect() as connection:
+        return connection.execute(
+            sqlalchemy.select(ingested_files_table.c.sha256).where(ingested_files_table.c.sha256 == sha256)
+        ).first() is not None
+
+def _exists(connection, type_, name):
+    # Expression indexes aren't reflected by the inspector, so ask the catalog
+    if POSTGRESQL:
+        return connection.execute(sqlalchemy.text("SELECT to_regclass(:name) IS NOT NULL"), {'name': name}).scalar()
+    return connection.execute(sqlalchemy.text(
+        "SELECT 1 FROM sqlite_master WHERE type = :type AND name = :name"
+    ), {'type': type_, 'name': name}).first() is not None
+
+def _columns(connection, table_name):
+    return {column['name'] for column in sqlalchemy.inspect(connection).get_columns(table_name)}
+
+def _deduplicate(connection, table):
+    """Removes rows that repeat a natural key, keeping the first one inserted."""
+    first_ids = sqlalchemy.select(func.min(table.c.id)).group_by(*_natural_key(table))
+    return connection.execute(table.delete().where(table.c.id.not_in(first_ids))).rowcount
+
+def _add_typed_columns(connection, table):
+    """
+    Adds the typed date/amount columns to a table created before they existed and
+    fills them from the raw columns. Returns True if the table was upgraded.
+    """
+    existing = _columns(connection, table.name)
+    missing = [column for column in TYPED_COLUMNS[table.name].values() if column not in existing]
+    if not missing:
+        return False
+    for name in missing:
+        connection.execute(sqlalchemy.text(f"ALTER TABLE {table.name} ADD COLUMN {name} {table.c[name].type.compile(connection.dialect)}"))
+    raw_columns = list(TYPED_COLUMNS[table.name])
+    rows = [dict(row._mapping) for row in connection.execute(sqlalchemy.select(table.c.id, *[table.c[name] for name in raw_columns]))]
+    if rows:
+        updates = _typed_values(table.name, rows)
+        connection.execute(
+            table.update().where(table.c.id == sqlalchemy.bindparam('row_id')).values({name: sqlalchemy.bindparam(f'new_{name}') for name in updates}),
+            [dict({f'new_{name}': values[i] for name, values in updates.items()}, row_id=row['id']) for i, row in enumerate(rows)]
+        )
+    print(f"Added typed date/amount columns to {len(rows)} rows in the {table.name} table.")
+    return True
+
+def _add_entity_ids(connection, table):
+    """
+    Adds the entity_id column to a table from before entity resolution and
+    resolves its existing names. Returns True if the table was upgraded.
+    """
+    if 'entity_id' in _columns(connection, table.name):
+        return False
+    connection.execute(sqlalchemy.text(f"ALTER TABLE {table.name} ADD COLUMN entity_id INTEGER"))
+    _resolve_rows(connection, table)
+    return True
+
+def _rekey_entities(connection):
+    """
+    Resolves every row again if entities were created from spellings with a
+    missing part ('nan Chandi Empire Inc'), which earlier versions kept in the
+    match key, so those rows join the entities of the same names spelled without
+    it. Returns True if the entities were rebuilt.
+    """
+    names = connection.execute(sqlalchemy.select(entities_table.c.name).where(entities_table.c.name.like('%nan%'))).scalars()
+    if all(entities.display_name(name) == name for name in names):
+        return False
+    connection.execute(entity_names_table.delete())
+    connection.execute(entities_table.delete())
+    for table in (contributions_table, expenditures_table):
+        _resolve_rows(connection, table)
+    return True
+
+def _resolve_rows(connection, table):
+    """Sets entity_id on every row of a table from its contributor or payee name."""
+    name_column = table.c[ENTITY_COLUMNS[table.name]]
+    rows = connection.execute(sqlalchemy.select(table.c.id, name_column).order_by(table.c.id)).all()
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        chunk = rows[start:start + INSERT_BATCH_SIZE]
+        entity_ids = resolve_entities(connection, [name for _, name in chunk])
+        connection.execute(
+            table.update().where(table.c.id == sqlalchemy.bindparam('row_id')).values(entity_id=sqlalchemy.bindparam('new_entity_id')),
+            [{'row_id': row_id, 'new_entity_id': entity_ids[name]} for row_id, name in chunk]
+        )
+    print(f"Resolved entities for {len(rows)} rows in the {table.name} table.")
+
 def create_database():
-    """Creates the database and tables if they don't already exist."""
+    """Creates the database, tables and search indexes if they don't already exist."""
     METADATA.create_all(ENGINE)
+    with ENGINE.begin() as connection:
+        upgraded = [table.name for table in (contributions_table, expenditures_table) if _add_typed_columns(connection, table)]
+        # Entity totals regroup once existing rows are resolved; the Parquet store is unaffected
+        resolved = [table.name for table in (contributions_table, expenditures_table) if _add_entity_ids(connection, table)]
+        if _rekey_entities(connection):
+            resolved = [table.name for table in (contributions_table, expenditures_table)]
+        for rollup_table in (rollup_filer_periods_table, rollup_entities_table):
+            if 'total_cents' not in _columns(connection, rollup_table.name):
+                connection.execute(sqlalchemy.text(f"ALTER TABLE {rollup_table.name} ADD COLUMN total_cents BIGINT"))
+                upgraded.append(rollup_table.name)
+        for name in OBSOLETE_INDEXES:
+            connection.execute(sqlalchemy.text(f"DROP INDEX IF EXISTS {name}"))
+        for table, index in zip((contributions_table, expenditures_table), natural_key_indexes):
+            if not _exists(connection, 'index', index.name):
+                removed = _deduplicate(connection, table)
+                if removed:
+                    print(f"Removed {removed} duplicate rows from the {table.name} table.")
+                index.create(connection)
+        for index in range_indexes + entity_indexes:
+            if not _exists(connection, 'index', index.name):
+                index.create(connection)
+        for table_name in FTS_COLUMNS:
+            if POSTGRESQL:
+                for statement in _trigram_ddl(table_name):
+                    connection.execute(sqlalchemy.text(statement))
+            elif not _exists(connection, 'table', f"{table_name}_fts"):
+                for statement in _fts_ddl(table_name):
+                    connection.execute(sqlalchemy.text(statement))
+        # Fill the rollups the first time they are created on an existing database,
+        # and recompute them after an upgrade (in cents, or per resolved entity)
+        if upgraded or resolved or connection.execute(sqlalchemy.select(func.count()).select_from(rollup_entities_table)).scalar() == 0:
+            rebuild_rollups(connection)
+        upto_ids = _max_ids(connection)
+        _bump_data_generation(connection) # Upgrades above may have changed rows
+    # Likewise backfill the Parquet store the first time it is enabled, or
+    # rewrite it if it predates the typed columns
+    if upgraded:
+        analytics.clear()
+    missing = {table: [(1, max_id)] for table, max_id in upto_ids.items() if max_id and not analytics.exists(table)}
+    if analytics.analytics_dir() and missing:
+        _export_to_analytics(missing)
     print(f"Database '{DB_NAME}' and tables created successfully.")
 
-def insert_data(data):
+def _typed_values(table_name, rows):
+    """
+    Parses a batch's raw dates and amounts in one vectorized pass each, returning
+    typed column name -> values in row order.
+    """
+    typed = {}
+    for raw_column, typed_column in TYPED_COLUMNS[table_name].items():
+        values = [row.get(raw_column) for row in rows]
+        if typed_column.endswith('_day'):
+            typed[typed_column] = normalize.to_dates(normalize.parse_dates(values))
+        else:
+            typed[typed_column] = normalize.parse_cents(values)
+    return typed
+
+def _load(connection, table, records, batch_size):
+    """
+    Writes records in batch_size chunks, skipping any whose natural key already
+    exists. Returns the ids of the rows actually inserted.
+    """
+    # The ids say exactly which rows this load added, whatever other writers
+    # insert meanwhile; psycopg2 doesn't report executemany rowcounts anyway
+    statement = insert(table).on_conflict_do_nothing().returning(table.c.id)
+    columns = [column.name for column in table.columns if column.name != 'id']
+    inserted = []
+    for start in range(0, len(records), batch_size):
+        # PDF records only carry the keys they found, so give every row the full column set
+        rows = [{name: record.get(name) for name in columns} for record in records[start:start + batch_size]]
+        with metrics.timed('normalize_types', source=table.name):
+            for typed_column, values in _typed_values(table.name, rows).items():
+                for row, value in zip(rows, values):
+                    row[typed_column] = value
+        with metrics.timed('entity_resolution', source=table.name):
+            entity_ids = resolve_entities(connection, [row[ENTITY_COLUMNS[table.name]] for row in rows])
+            for row in rows:
+                row['entity_id'] = entity_ids[row[ENTITY_COLUMNS[table.name]]]
+        inserted.extend(row_id for row_id, in connection.execute(statement, rows))
+    return inserted
+
+def insert_batches(batches, batch_size=INSERT_BATCH_SIZE, on_batch=None, file_hash=None, filename=None):
+    """
+    Bulk loads record batches as they are produced, e.g. read back from a spool
+    (spool.py). The write lock is held while batches are pulled, so they should
+    not be extracted on the fly.
+
+    Only one batch is held in memory at a time and everything is written in a
+    single transaction, so a file is either fully loaded or not at all. Rows whose
+    (source_file, filer, name, amount, date) already exist are skipped, so
+    re-uploading a file is a no-op. The newly inserted rows are folded into the
+    rollup tables in the same transaction, and appended to the Parquet analytics
+    store once it commits.
+
+    Args:
+        batches (iterable): Dictionaries with 'contributions' and 'expenditures' lists.
+        batch_size (int): Rows per executemany() call.
+        on_batch (callable): Called with the running stats after each batch.
+        file_hash (str): SHA-256 of the source file. If given, the file is recorded
+            in ingested_files in the same transaction, so is_ingested() only ever
+            reports files that were loaded completely. Files that yield no rows
+            are not recorded.
+        filename (str): Name of the source file, recorded alongside file_hash.
+
+    Returns:
+        dict: Rows received, inserted and skipped as duplicates per table, plus
+        the seconds spent writing and the write throughput in rows/sec.
+    """
+    stats = {table: {'received': 0, 'inserted': 0} for table in ('contributions', 'expenditures')}
+    elapsed = 0.0 # Time spent writing, excluding however long the batches take to produce
+    id_ranges = {'contributions': [], 'expenditures': []} # Rows this load inserted
+    with WRITE_LOCK, ENGINE.begin() as connection:
+        for batch in batches:
+            start = time.perf_counter()
+            for table in (contributions_table, expenditures_table):
+                records = batch.get(table.name)
+                if records:
+                    with metrics.timed('db_insert', source=table.name):
+                        inserted_ids = _load(connection, table, records, batch_size)
+                    _add_id_ranges(id_ranges[table.name], inserted_ids)
+                    inserted = len(inserted_ids)
+                    stats[table.name]['received'] += len(records)
+                    stats[table.name]['inserted'] += inserted
+                    metrics.count('rows_total', inserted, stage='inserted', source=table.name)
+                    metrics.count('rows_total', len(records) - inserted, stage='skipped', source=table.name)
+            elapsed += time.perf_counter() - start
+            if on_batch:
+                on_batch(stats)
+        start = time.perf_counter()
+        with metrics.timed('rollup_update', source='all'):
+            _update_rollups(connection, id_ranges)
+        if stats['contributions']['inserted'] + stats['expenditures']['inserted']:
+            _bump_data_generation(connection)
+        # Extractors log and yield nothing for unreadable files; don't let those
+        # count as ingested, or a fixed re-upload would be skipped
+        if file_hash and stats['contributions']['received'] + stats['expenditures']['received']:
+            connection.execute(insert(ingested_files_table).on_conflict_do_nothing(), {
+                'sha256': file_hash,
+                'filename': filename,
+                'contributions': stats['contributions']['received'],
+                'expenditures': stats['expenditures']['received'],
+                'ingested_at': time.time()
+            })
+    elapsed += time.perf_counter() - start # Rollups and commit
+    if analytics.analytics_dir():
+        _export_to_analytics(id_ranges)
+
+    received = 0
+    for table, counts in stats.items():
+        counts['skipped'] = counts['received'] - counts['inserted']
+        received += counts['received']
+        print(f"Inserted {counts['inserted']} records into the {table} table ({counts['skipped']} duplicates skipped).")
+    stats['seconds'] = elapsed
+    stats['rows_per_sec'] = received / elapsed if elapsed else 0.0
+    print(f"Loaded {received} rows in {elapsed:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec).")
+    return stats
+
+def insert_data(data, batch_size=INSERT_BATCH_SIZE):
     """
     Inserts extracted data into the appropriate database tables.
 
     Args:
         data (dict): A dictionary containing 'contributions' and 'expenditures' lists.
+        batch_size (int): Rows per executemany() call.
     """
-    with ENGINE.connect() as connection:
-        if data.get('contributions'):
-            connection.execute(contributions_table.insert(), data['contributions'])
-            print(f"Inserted {len(data['contributions'])} records into the contributions table.")
-        
-        if data.get('expenditures'):
-            connection.execute(expenditures_table.insert(), data['expenditures'])
-            print(f"Inserted {len(data['expenditures'])} records into the expenditures table.")
+    return insert_batches([data], batch_size)
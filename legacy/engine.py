@@ -0,0 +1,97 @@
+import os
+from sqlalchemy import create_engine, event
+
+# Database engines for database.py, configured from the environment:
+#
+#   DATABASE_URL            Where the data lives (default sqlite:///campaign_finance.db).
+#                           A postgresql:// URL uses the same schema on PostgreSQL.
+#   DATABASE_READ_URL       Optional separate URL for queries, e.g. a PostgreSQL replica.
+#   DB_READ_POOL_SIZE       Pooled reader connections kept open (default 8), and
+#   DB_READ_MAX_OVERFLOW    how many more may be opened under load (default 8).
+#   DB_POOL_TIMEOUT         Seconds to wait for a free connection (default 30).
+#   DB_POOL_RECYCLE         Seconds after which connections are replaced (default 1800).
+#   SQLITE_CACHE_MB         Page cache per SQLite connection (default 64).
+#   SQLITE_MMAP_MB          Bytes of the file SQLite reads through mmap (default 256).
+#   SQLITE_SYNCHRONOUS      NORMAL (default; safe with WAL, fsyncs at checkpoints) or FULL.
+#   SQLITE_BUSY_TIMEOUT_MS  How long a connection waits on a lock before failing (default 30000).
+#
+# Writes go through a single pooled connection, so loads are serialized instead of
+# contending for SQLite's write lock. Queries use a separate pool of read-only
+# connections; in WAL mode they read the last committed state while a load is in
+# progress, instead of waiting for it.
+#
+# Other processes (gunicorn workers, batch_ingest) have writer connections of their
+# own, so every write transaction takes the database-wide write lock as it begins:
+# BEGIN IMMEDIATE on SQLite, a transaction-level advisory lock on PostgreSQL. A load
+# that reads before it writes (entity resolution does) then never works from rows
+# another process is about to commit; it waits for that process instead.
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///campaign_finance.db')
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL') or DATABASE_URL
+
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', '8'))
+DB_READ_MAX_OVERFLOW = int(os.getenv('DB_READ_MAX_OVERFLOW', '8'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+SQLITE_CACHE_MB = int(os.getenv('SQLITE_CACHE_MB', '64'))
+SQLITE_MMAP_MB = int(os.getenv('SQLITE_MMAP_MB', '256'))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+
+if SQLITE_SYNCHRONOUS not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+    raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {SQLITE_SYNCHRONOUS}")
+
+# pg_advisory_xact_lock key held by PostgreSQL write transactions
+WRITER_LOCK_KEY = 460
+
+def _sqlite_pragmas(read_only):
+    """Returns a connect listener applying the SQLite pragmas for writer or reader connections."""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode=WAL") # Stored in the file, so readers inherit it
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size={-SQLITE_CACHE_MB * 1024}") # Negative means KiB
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+        if not read_only:
+            dbapi_connection.isolation_level = None # pysqlite would BEGIN deferred; _begin_write begins instead
+    return set_pragmas
+
+def _begin_write(connection):
+    """Starts a writer transaction holding the database's write lock (see above)."""
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        connection.exec_driver_sql(f"SELECT pg_advisory_xact_lock({WRITER_LOCK_KEY})")
+
+def create_engines(url=DATABASE_URL, read_url=None):
+    """
+    Creates the writer and reader engines.
+
+    Args:
+        url (str): Database URL for writes (and reads, unless read_url is given).
+        read_url (str): Database URL for queries.
+
+    Returns:
+        tuple: (writer engine with a single connection, read-only reader engine)
+    """
+    read_url = read_url or (DATABASE_READ_URL if url == DATABASE_URL else url)
+    writer = create_engine(url, pool_size=1, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=not url.startswith('sqlite'))
+    reader = create_engine(read_url, pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=not read_url.startswith('sqlite'))
+    if writer.dialect.name == 'sqlite':
+        event.listen(writer, 'connect', _sqlite_pragmas(read_only=False))
+    if writer.dialect.name in ('sqlite', 'postgresql'):
+        event.listen(writer, 'begin', _begin_write)
+    if reader.dialect.name == 'sqlite':
+        event.listen(reader, 'connect', _sqlite_pragmas(read_only=True))
+    elif reader.dialect.name == 'postgresql':
+        reader = reader.execution_options(postgresql_readonly=True)
+    return writer, reader
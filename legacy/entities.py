@@ -0,0 +1,98 @@
+import re
+import difflib
+import unicodedata
+
+# Name matching for entity resolution. The extractors build contributor and payee
+# names as "first last", so one donor shows up as 'John Smith', 'SMITH, JOHN',
+# 'Jon Smith' and 'John A. Smith Jr.'. normalize_name() folds case, punctuation,
+# word order and noise words into one key; names whose keys differ are compared
+# only against the few known keys that share a blocking key (block_keys()), and
+# merged when similarity() reaches MATCH_THRESHOLD. database.py stores the keys
+# and assigns the entity_ids.
+
+# Titles, generational suffixes and company forms that don't distinguish entities
+NOISE_WORDS = frozenset((
+    'MR', 'MRS', 'MS', 'MISS', 'DR', 'HON',
+    'JR', 'SR', 'II', 'III', 'IV', 'ESQ',
+    'INC', 'INCORPORATED', 'LLC', 'LLP', 'LP', 'LTD', 'CO', 'CORP', 'CORPORATION', 'COMPANY', 'THE',
+))
+
+# 'Jon Smith' ~ 'John Smith' (0.95) and 'Ana Lopez' ~ 'Anna Lopez' (0.95) match;
+# 'Maria Garcia' and 'Mario Garcia' (0.92) don't
+MATCH_THRESHOLD = 0.93
+
+# The extractors render a missing first or last name as pandas' 'nan', as in
+# 'nan Chandi Empire Inc'. Only the lowercase word is dropped: Nan is a first name.
+_MISSING_PART = re.compile(r"(?<!\S)nan(?!\S)")
+_APOSTROPHES = re.compile(r"['`’.]")
+_SEPARATORS = re.compile(r"[^A-Z0-9]+")
+_SOUNDEX_CODES = str.maketrans('BFPVCGJKQSXZDTLMNR', '111122222222334556')
+
+def normalize_name(name):
+    """
+    Returns the match key for a name: upper case ASCII words without punctuation,
+    NOISE_WORDS or a missing part ('nan'), in sorted order. Middle initials are
+    dropped when at least two other words remain. Returns None for a missing or
+    empty name.
+    """
+    if not name:
+        return None
+    text = unicodedata.normalize('NFKD', _MISSING_PART.sub(' ', str(name))).encode('ascii', 'ignore').decode().upper()
+    text = _APOSTROPHES.sub('', text.replace('&', ' AND ')) # O'Brien -> OBRIEN, J.P. -> JP
+    words = [word for word in _SEPARATORS.split(text) if word and word not in NOISE_WORDS]
+    if len(words) > 2:
+        words = [word for word in words if len(word) > 1] or words
+    return ' '.join(sorted(words)) or None
+
+def display_name(name):
+    """Returns a name as shown for its entity: without the 'nan' of a missing part, and with single spaces."""
+    return ' '.join(_MISSING_PART.sub(' ', str(name)).split())
+
+def soundex(word):
+    """American Soundex code of a word, e.g. 'SMITH' and 'SMYTHE' -> 'S530'. Numbers are kept as they are."""
+    if not word[0].isalpha():
+        return word
+    codes = word.translate(_SOUNDEX_CODES)
+    code, last = word[0], codes[0]
+    for letter, digit in zip(word[1:], codes[1:]):
+        if digit.isdigit() and digit != last:
+            code += digit
+        if letter not in 'HW': # H and W don't separate repeated codes; vowels do
+            last = digit
+    return (code + '000')[:4]
+
+def block_keys(key):
+    """
+    Returns the (phonetic, prefix) blocking keys of a normalize_name() key. A
+    name is only compared with known names sharing one of them: the Soundex of
+    every word catches spelling variants that sound alike, and the first three
+    letters of every word catch typos further into a word.
+    """
+    words = key.split()
+    return ' '.join(soundex(word) for word in words), ' '.join(word[:3] for word in words)
+
+def similarity(a, b):
+    """Similarity of two normalize_name() keys, from 0.0 to 1.0."""
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < MATCH_THRESHOLD or matcher.quick_ratio() < MATCH_THRESHOLD:
+        return 0.0 # Upper bounds; skip the full comparison when they already fall short
+    return matcher.ratio()
+
+def best_match(key, candidates):
+    """
+    Picks the candidate most similar to key.
+
+    Args:
+        key (str): A normalize_name() key with no exact match.
+        candidates (iterable): (key, entity_id) pairs from key's blocks.
+
+    Returns:
+        The entity_id of the best candidate scoring at least MATCH_THRESHOLD (the
+        lowest entity_id on a tie), or None.
+    """
+    best_score, best_id = 0.0, None
+    for candidate_key, entity_id in candidates:
+        score = similarity(key, candidate_key)
+        if score >= MATCH_THRESHOLD and (score > best_score or (score == best_score and entity_id < best_id)):
+            best_score, best_id = score, entity_id
+    return best_id
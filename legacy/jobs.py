@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+from sqlalchemy import create_engine, event, text, Table, Column, Integer, String, Float, MetaData
+
+from data_extractor import stream_uploaded_file
+from database import insert_batches, is_ingested
+from spool import write_spool, read_spool
+import metrics
+
+# The queue lives in its own SQLite file so progress updates never wait on the
+# write lock held by a bulk load into campaign_finance.db.
+JOBS_DB_NAME = 'ingest_jobs.db'
+JOBS_ENGINE = create_engine(f'sqlite:///{JOBS_DB_NAME}', connect_args={'timeout': 30})
+JOBS_METADATA = MetaData()
+
+# Files still 'running' with no progress for this long belong to a worker that
+# died; they are put back on the queue when workers start.
+STALE_SECONDS = 600
+
+@event.listens_for(JOBS_ENGINE, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+jobs_table = Table('ingest_jobs',
+    JOBS_METADATA,
+    Column('id', String, primary_key=True),
+    Column('created_at', Float)
+)
+
+job_files_table = Table('ingest_job_files',
+    JOBS_METADATA,
+    Column('id', Integer, primary_key=True),
+    Column('job_id', String, index=True),
+    Column('filename', String),
+    Column('file_path', String),
+    Column('file_hash', String), # SHA-256 of the file's bytes
+    Column('status', String, index=True), # queued, running, done, skipped or failed
+    Column('pages_total', Integer, default=0),
+    Column('pages_done', Integer, default=0),
+    Column('rows_extracted', Integer, default=0),
+    Column('rows_inserted', Integer, default=0),
+    Column('rows_skipped', Integer, default=0),
+    Column('error', String),
+    Column('page_report', String), # JSON list of how each PDF page was read (see data_extractor)
+    Column('created_at', Float),
+    Column('started_at', Float),
+    Column('updated_at', Float),
+    Column('finished_at', Float)
+)
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+def create_jobs_database():
+    """Creates the job queue tables if they don't already exist."""
+    JOBS_METADATA.create_all(JOBS_ENGINE)
+    with JOBS_ENGINE.begin() as connection:
+        columns = {row.name for row in connection.execute(text("PRAGMA table_info(ingest_job_files)"))}
+        for column in ('file_hash', 'page_report'):
+            if column not in columns:
+                connection.execute(text(f"ALTER TABLE ingest_job_files ADD COLUMN {column} VARCHAR"))
+
+def enqueue_job(files):
+    """
+    Queues a job that ingests each file in the background.
+
+    Args:
+        files (list): (filename, file_path, file_hash) tuples of files already
+            saved to disk. file_hash may be None if the content hash is unknown.
+
+    Returns:
+        str: The job id to poll with get_job.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with JOBS_ENGINE.begin() as connection:
+        connection.execute(jobs_table.insert(), {'id': job_id, 'created_at': now})
+        connection.execute(job_files_table.insert(), [
+            {'job_id': job_id, 'filename': filename, 'file_path': file_path, 'file_hash': file_hash,
+             'status': 'queued', 'created_at': now}
+            for filename, file_path, file_hash in files
+        ])
+    _wakeup.set()
+    return job_id
+
+def get_job(job_id):
+    """
+    Returns a job's overall status and per-file progress and timings, or None if
+    there is no such job. PDFs also list how each page was read ('text', 'cache',
+    'ocr' or 'failed') and how long it took, once extracted.
+    """
+    with JOBS_ENGINE.connect() as connection:
+        job = connection.execute(jobs_table.select().where(jobs_table.c.id == job_id)).first()
+        if job is None:
+            return None
+        files = connection.execute(
+            job_files_table.select().where(job_files_table.c.job_id == job_id).order_by(job_files_table.c.id)
+        ).fetchall()
+
+    now = time.time()
+    file_statuses = []
+    for row in files:
+        status = dict(row._mapping)
+        del status['file_path']
+        status['page_report'] = json.loads(status['page_report']) if status['page_report'] else None
+        if status['started_at']:
+            status['seconds'] = (status['finished_at'] or now) - status['started_at']
+        file_statuses.append(status)
+
+    statuses = {status['status'] for status in file_statuses}
+    if statuses <= {'done', 'skipped', 'failed'}:
+        overall = 'failed' if 'failed' in statuses else 'done'
+    else:
+        overall = 'running' if statuses & {'running', 'done', 'skipped', 'failed'} else 'queued'
+    return {'id': job_id, 'status': overall, 'created_at': job.created_at, 'files': file_statuses}
+
+def _update_file(file_id, **values):
+    values['updated_at'] = time.time()
+    with JOBS_ENGINE.begin() as connection:
+        connection.execute(job_files_table.update().where(job_files_table.c.id == file_id).values(**values))
+
+def _claim_next_file():
+    """Atomically marks the oldest queued file as running and returns it, or None."""
+    now = time.time()
+    with JOBS_ENGINE.begin() as connection:
+        return connection.execute(text(
+            "UPDATE ingest_job_files SET status = 'running', started_at = :now, updated_at = :now "
+            "WHERE id = (SELECT id FROM ingest_job_files WHERE status = 'queued' ORDER BY id LIMIT 1) "
+            "RETURNING id, filename, file_path, file_hash"
+        ), {'now': now}).first()
+
+def _requeue_stale_files():
+    with JOBS_ENGINE.begin() as connection:
+        connection.execute(text(
+            "UPDATE ingest_job_files SET status = 'queued' WHERE status = 'running' AND updated_at < :cutoff"
+        ), {'cutoff': time.time() - STALE_SECONDS})
+
+def _process_file(app, job_file):
+    """Extracts and inserts one queued file, recording progress as it goes."""
+    # Another job may have loaded the same content since this one was queued
+    if job_file.file_hash and is_ingested(job_file.file_hash):
+        app.logger.info(f"Skipping {job_file.filename}: identical content already ingested.")
+        _update_file(job_file.id, status='skipped', finished_at=time.time())
+        return
+    app.logger.info(f"Ingesting {job_file.filename} (job file {job_file.id})")
+    rows_extracted = 0
+
+    def on_page(pages_done, pages_total):
+        _update_file(job_file.id, pages_done=pages_done, pages_total=pages_total)
+
+    def counted(batches):
+        nonlocal rows_extracted
+        for batch in batches:
+            rows_extracted += len(batch.get('contributions') or []) + len(batch.get('expenditures') or [])
+            _update_file(job_file.id, rows_extracted=rows_extracted)
+            yield batch
+
+    def on_batch(stats):
+        _update_file(job_file.id,
+            rows_inserted=stats['contributions']['inserted'] + stats['expenditures']['inserted'])
+
+    page_report = []
+    batches = stream_uploaded_file(job_file.file_path, app.config['INGEST_BATCH_SIZE'], on_page=on_page, report=page_report)
+    if batches is None:
+        raise ValueError(f"Unsupported file type: {job_file.filename}")
+    # Extract to a spool first, so files extract concurrently and a load only
+    # holds the write lock for as long as it takes to write
+    fd, spool_path = tempfile.mkstemp(prefix='ingest_job_', suffix='.pickle')
+    os.close(fd)
+    try:
+        write_spool(counted(batches), spool_path)
+        if page_report:
+            _update_file(job_file.id, page_report=json.dumps(page_report))
+        failed_pages = [str(entry['page']) for entry in page_report if entry['method'] == 'failed']
+        if failed_pages and not rows_extracted:
+            raise ValueError(f"No records extracted; OCR failed on page(s) {', '.join(failed_pages)}")
+        stats = insert_batches(read_spool(spool_path), app.config['INSERT_BATCH_SIZE'], on_batch=on_batch,
+            file_hash=job_file.file_hash, filename=job_file.filename)
+    finally:
+        os.remove(spool_path)
+    _update_file(job_file.id, status='done', finished_at=time.time(),
+        rows_inserted=stats['contributions']['inserted'] + stats['expenditures']['inserted'],
+        rows_skipped=stats['contributions']['skipped'] + stats['expenditures']['skipped'])
+    app.logger.info(f"Finished ingesting {job_file.filename}: {stats}")
+
+def _worker_loop(app):
+    with app.app_context():
+        while True:
+            job_file = _claim_next_file()
+            if job_file is None:
+                _wakeup.wait(timeout=1.0)
+                _wakeup.clear()
+                continue
+            try:
+                source = os.path.splitext(job_file.filename)[1].lstrip('.').lower()
+                with metrics.timed('ingest_file', source=source), metrics.profiled(f"job:{job_file.filename}"):
+                    _process_file(app, job_file)
+            except Exception as e:
+                app.logger.error(f"Failed to ingest {job_file.filename}: {e}", exc_info=True)
+                _update_file(job_file.id, status='failed', error=str(e), finished_at=time.time())
+
+def start_workers(app, count=None):
+    """
+    Starts the background ingestion workers for this process (once). Each worker
+    processes one file at a time, so up to `count` files are ingested concurrently.
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        create_jobs_database()
+        _requeue_stale_files()
+        count = count or app.config.get('INGEST_WORKERS') or 1
+        for number in range(count):
+            worker = threading.Thread(target=_worker_loop, args=(app,), name=f"ingest-worker-{number}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        app.logger.info(f"Started {count} ingestion workers (pid {os.getpid()}).")
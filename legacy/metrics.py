@@ -0,0 +1,132 @@
+import os
+import time
+import random
+import cProfile
+import threading
+import contextlib
+from flask import current_app
+
+# Lightweight in-process metrics for the ingestion and search hot paths, exposed
+# in the Prometheus text format by /metrics. Each gunicorn worker keeps its own
+# counts, as with prometheus_client's default (non-multiprocess) mode.
+
+PREFIX = 'votervantage'
+
+# Histogram bucket upper bounds in seconds; ingestion stages run from milliseconds (a
+# query) to minutes (OCR'ing a long PDF)
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_lock = threading.Lock()
+_counters = {} # (name, labels) -> value
+_histograms = {} # (name, labels) -> [bucket counts..., count, sum]
+_help = {
+    'stage_seconds': 'Time spent in each instrumented stage.',
+    'rows_total': 'Rows extracted, inserted or skipped as duplicates.',
+    'pdf_pages_total': 'PDF pages processed, by how their text was obtained.',
+    'http_request_seconds': 'Request latency by endpoint.',
+    'profiles_total': 'Requests and jobs profiled.',
+    'cache_events_total': 'Query cache hits, misses, evictions and expirations.',
+}
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def count(name, value=1, **labels):
+    """Adds value to the counter `name` with the given labels."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    """Records one observation in the histogram `name` with the given labels."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+
+@contextlib.contextmanager
+def timed(stage, **labels):
+    """Times the enclosed block into stage_seconds{stage=...}, even if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def render_prometheus():
+    """Returns every metric in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, list(values)) for key, values in _histograms.items())
+
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        metric = f'{PREFIX}_{name}'
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f'# HELP {metric} {_help.get(name, name)}')
+            lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric}{_format_labels(labels)} {value}')
+    for (name, labels), values in histograms:
+        metric = f'{PREFIX}_{name}'
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f'# HELP {metric} {_help.get(name, name)}')
+            lines.append(f'# TYPE {metric} histogram')
+        for bound, bucket_count in zip(BUCKETS, values):
+            lines.append(f'{metric}_bucket{_format_labels(labels, [("le", bound)])} {bucket_count}')
+        lines.append(f'{metric}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-2]}')
+        lines.append(f'{metric}_count{_format_labels(labels)} {values[-2]}')
+        lines.append(f'{metric}_sum{_format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    """Clears all metrics (for benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+@contextlib.contextmanager
+def profiled(name):
+    """
+    Profiles the enclosed block with cProfile for a random app.config['PROFILE_SAMPLE_RATE']
+    fraction of calls, writing <name>-<timestamp>.prof to app.config['PROFILE_DIR'].
+    Open the output with `python -m pstats` or snakeviz. Does nothing when the
+    rate is 0 (the default).
+    """
+    rate = current_app.config.get('PROFILE_SAMPLE_RATE') or 0
+    if rate <= 0 or random.random() >= rate:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError: # Another profiler is already active in this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile_dir = current_app.config['PROFILE_DIR']
+        os.makedirs(profile_dir, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+        path = os.path.join(profile_dir, f"{safe_name}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{threading.get_ident()}.prof")
+        profiler.dump_stats(path)
+        count('profiles_total', kind=name.split(':')[0])
+        current_app.logger.info(f"Wrote profile of {name} to {path}")
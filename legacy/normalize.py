@@ -0,0 +1,81 @@
+
+# Batch parsers turning the raw dates and amounts the extractors produce into
+# typed values for the *_day (DATE) and *_cents (INTEGER) columns. Workbooks give
+# str(Timestamp) values like '2024-01-05 00:00:00' and PDFs give whatever OCR
+# read, like '1/2/24'; both become the same calendar day, so date filters and
+# ordering are chronological rather than lexicographic. Amounts become integer
+# cents, so totals add up exactly.
+#
+# numpy and pandas are imported when a parser first runs, since app.py imports
+# this module for the search form but rarely needs more than date.fromisoformat().
+
+# Tried in order on the values no earlier format could parse
+DATE_FORMATS = ('ISO8601', '%m/%d/%Y', '%m/%d/%y')
+
+# Parsed dates outside this range are OCR misreads rather than real filings
+MIN_YEAR, MAX_YEAR = 1900, 2100
+
+def parse_dates(values):
+    """
+    Parses a batch of dates in any of DATE_FORMATS.
+
+    Args:
+        values (sequence): Date strings, Timestamps, or None.
+
+    Returns:
+        numpy.ndarray: datetime64[D] days, NaT where a value is missing or unparseable.
+    """
+    import numpy as np
+    import pandas as pd
+    series = pd.Series(np.asarray(values, dtype=object))
+    days = np.full(len(series), np.datetime64('NaT'), dtype='datetime64[D]')
+    pending = series.notna().to_numpy().copy()
+    for date_format in DATE_FORMATS:
+        positions = np.flatnonzero(pending)
+        if not len(positions):
+            break
+        parsed = pd.to_datetime(series.iloc[positions], format=date_format, errors='coerce').to_numpy().astype('datetime64[D]')
+        days[positions] = parsed
+        pending[positions[~np.isnat(parsed)]] = False
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    days[~np.isnat(days) & ((years < MIN_YEAR) | (years > MAX_YEAR))] = np.datetime64('NaT')
+    return days
+
+def to_dates(days):
+    """Converts datetime64[D] days to datetime.date objects (None for NaT), for DATE columns."""
+    return days.astype(object)
+
+def to_iso(days):
+    """Converts datetime64[D] days to 'YYYY-MM-DD' strings (None for NaT)."""
+    import numpy as np
+    iso = np.datetime_as_string(days).astype(object)
+    iso[np.isnat(days)] = None
+    return iso
+
+def parse_cents(values):
+    """
+    Parses a batch of amounts into integer cents. Numbers are used as they are;
+    strings may carry '$', thousands separators and accounting-style parentheses
+    for negatives.
+
+    Args:
+        values (sequence): Floats, ints, strings or None.
+
+    Returns:
+        numpy.ndarray: Object array of int cents, None where a value is missing or unparseable.
+    """
+    import numpy as np
+    import pandas as pd
+    series = pd.Series(np.asarray(values, dtype=object))
+    numbers = pd.to_numeric(series, errors='coerce').astype(float)
+    retry = numbers.isna() & series.notna()
+    if retry.any():
+        cleaned = (series[retry].astype(str)
+            .str.replace(r'[$,\s]', '', regex=True)
+            .str.replace(r'^\((.*)\)$', r'-\1', regex=True))
+        numbers[retry] = pd.to_numeric(cleaned, errors='coerce')
+    cents = np.round(numbers.to_numpy() * 100)
+    parsed = np.isfinite(cents)
+    result = np.full(len(cents), None, dtype=object)
+    result[parsed] = cents[parsed].astype(np.int64).tolist()
+    return result
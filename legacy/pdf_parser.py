@@ -0,0 +1,196 @@
+import os
+import re
+
+# Record parsing for the text of Form 460 PDFs, whether it comes from a page's
+# text layer or from OCR. RecordParser is fed the pages one at a time, in page
+# order, and hands back the records each page completes, so extraction can load
+# them while later pages are still being OCR'd. Its records are those of the
+# original two-pass parser (kept as a reference in benchmarks/bench_pdf_parsing.py),
+# plus the page and line each record starts on.
+#
+# The parser is a state machine over the schedule being read. Header lines move
+# it between states:
+#
+#     'SCHEDULE A', 'SCHEDULE C'  -> CONTRIBUTIONS
+#     'SCHEDULE E'                -> EXPENDITURES
+#     'SUMMARY PAGE'              -> OUTSIDE (lines are ignored until the next schedule)
+#
+# Page breaks don't change the state: a schedule's continuation pages carry no
+# header, and a record may start at the bottom of one page and end on the next.
+# Inside a schedule, the first non-amount line of a record is its name and a line
+# with an amount completes it. Pages are joined as they were before, with no
+# separator, so text after a page's last newline runs into the next page's first line.
+
+OUTSIDE = None
+CONTRIBUTIONS = 'contributions'
+EXPENDITURES = 'expenditures'
+
+# Header keyword -> state it moves to, in order of precedence when a line has several
+SCHEDULE_HEADERS = (
+    ('SCHEDULE A', CONTRIBUTIONS),
+    ('SCHEDULE C', CONTRIBUTIONS),
+    ('SCHEDULE E', EXPENDITURES),
+    ('SUMMARY PAGE', OUTSIDE),
+)
+
+# The filer's name is the first non-empty line after the first line with this
+FILER_HEADER = 'NAME OF FILER'
+UNKNOWN_FILER = 'Unknown Filer'
+
+# Amount, name and date fields of each schedule state's records
+FIELDS = {
+    CONTRIBUTIONS: ('contribution_amount', 'contributor_name', 'contribution_date'),
+    EXPENDITURES: ('expenditure_amount', 'payee_name', 'expenditure_date'),
+}
+
+AMOUNT = re.compile(r'[\$]?\s*(\d{1,3}(?:,\d{3})*\.\d{2})')
+DATE = re.compile(r'(\d{1,2}/\d{1,2}/\d{2,4})')
+# Every header in one pattern, matched against the upper-cased line, so the lines
+# without one (nearly all) take a single search
+HEADER = re.compile('|'.join(re.escape(keyword) for keyword in [FILER_HEADER] + [keyword for keyword, _ in SCHEDULE_HEADERS]))
+
+# Where the filer name search stands
+_SEEKING, _AWAITING, _FOUND = range(3)
+
+class RecordParser:
+    """
+    Incremental parser for the records of one PDF. Call feed() with each page's
+    text in page order, then close(). Both return the records completed so far
+    as {"contributions": [...], "expenditures": [...]}.
+
+    Records carry "page" (1-based) and "line" (1-based, within that page) of
+    their first line. They are held back only until the filer name is found,
+    which on a Form 460 is on the cover page.
+    """
+
+    def __init__(self, file_path):
+        self.source_file = os.path.basename(file_path)
+        self.state = OUTSIDE
+        self.filer_name = None # Until it is found
+        self._filer_search = _SEEKING
+        self._held = {CONTRIBUTIONS: [], EXPENDITURES: []} # Records completed before the filer name was found
+        self._name = None # First line of the record being read, if one has started
+        self._date = None # First date on its lines so far
+        self._start = None # (page, line) it starts on
+        self._partial = '' # Text after the last newline of the previous page
+        self._partial_start = None
+
+    def feed(self, page_number, text):
+        """Parses the next page's text, returning the records it completed."""
+        records = {CONTRIBUTIONS: [], EXPENDITURES: []}
+        if '\n' not in text:
+            # An empty page, or one that ends before its first line does: nothing is complete yet
+            if not self._partial:
+                self._partial_start = (page_number, 1)
+            self._partial += text
+            return records
+        lines = text.split('\n')
+        first = 1
+        if self._partial:
+            lines[0] = self._partial + lines[0]
+            self._parse_line(lines[0], self._partial_start, records)
+            first = 2
+        self._partial = lines.pop()
+        self._partial_start = (page_number, len(lines) + 1)
+        for offset, line in enumerate(lines[first - 1:], first):
+            self._parse_line(line, (page_number, offset), records)
+        return records
+
+    def close(self):
+        """Parses what is left after the last page, returning the remaining records."""
+        records = {CONTRIBUTIONS: [], EXPENDITURES: []}
+        if self._partial:
+            self._parse_line(self._partial, self._partial_start, records)
+            self._partial = ''
+        if self._filer_search != _FOUND:
+            self._release(UNKNOWN_FILER, records)
+        return records
+
+    def _release(self, filer_name, records):
+        for table, held in self._held.items():
+            for record in held:
+                record['filer_name'] = filer_name
+            records[table].extend(held)
+            held.clear()
+
+    def _parse_line(self, line, start, records):
+        stripped = line.strip()
+        if self._filer_search == _AWAITING and stripped:
+            self.filer_name = stripped
+            self._filer_search = _FOUND
+            self._release(stripped, records)
+
+        line_upper = line.upper()
+        if HEADER.search(line_upper):
+            if self._filer_search == _SEEKING and FILER_HEADER in line_upper:
+                self._filer_search = _AWAITING
+            for keyword, state in SCHEDULE_HEADERS:
+                if keyword in line_upper:
+                    self.state = state
+                    self._name = None
+                    return
+
+        if self.state is OUTSIDE:
+            return
+
+        # Every amount has a decimal point; most lines (names, addresses) don't get as far as the regex
+        amount = AMOUNT.search(line) if '.' in line else None
+        if amount is None:
+            if not stripped:
+                return
+            if self._name is None:
+                self._name, self._start = stripped, start
+                self._date = DATE.search(stripped)
+            elif self._date is None:
+                self._date = DATE.search(stripped)
+            return
+        if self._name is None:
+            return # An amount with no record before it, e.g. a subtotal
+
+        date = self._date or DATE.search(line)
+        # The description is the line without its amounts
+        pieces, end = [line[:amount.start()]], amount.end()
+        for match in AMOUNT.finditer(line, end):
+            pieces.append(line[end:match.start()])
+            end = match.end()
+        pieces.append(line[end:])
+
+        amount_field, name_field, date_field = FIELDS[self.state]
+        record = {
+            "filer_name": self.filer_name,
+            amount_field: float(amount.group(1).replace(',', '')),
+            name_field: self._name,
+            "expenditure_description": ''.join(pieces).strip(), # Contributions have always carried it too
+        }
+        if date:
+            record[date_field] = date.group(1)
+        record["source_file"] = self.source_file
+        record["page"], record["line"] = self._start
+        self._name = None
+
+        if self._filer_search == _FOUND:
+            records[self.state].append(record)
+        else:
+            self._held[self.state].append(record)
+
+def parse_pages(page_texts, file_path):
+    """
+    Parses a PDF's page texts in one go.
+
+    Args:
+        page_texts (iterable): The text of each page, in page order.
+        file_path (str): Path of the PDF; its basename is each record's source_file.
+
+    Returns:
+        tuple: (contribution records, expenditure records).
+    """
+    parser = RecordParser(file_path)
+    contributions, expenditures = [], []
+    for page_number, text in enumerate(page_texts, 1):
+        records = parser.feed(page_number, text)
+        contributions.extend(records[CONTRIBUTIONS])
+        expenditures.extend(records[EXPENDITURES])
+    records = parser.close()
+    contributions.extend(records[CONTRIBUTIONS])
+    expenditures.extend(records[EXPENDITURES])
+    return contributions, expenditures
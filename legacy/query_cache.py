@@ -0,0 +1,81 @@
+import time
+import threading
+import collections
+
+import metrics
+
+# Stat name -> event label of the cache_events_total metric
+_EVENTS = {'hits': 'hit', 'misses': 'miss', 'evictions': 'eviction', 'expired': 'expired'}
+
+class QueryCache:
+    """
+    A bounded LRU cache whose entries also expire after ttl seconds. Keys should
+    include database.data_generation(), so entries cached before new data was
+    loaded are never served again; they simply age out of the LRU.
+
+    Args:
+        name (str): Label for the cache_events_total metric.
+        maxsize (int): Entries kept; the least recently used is evicted beyond this.
+            0 disables the cache.
+        ttl (float): Seconds an entry may be served for.
+    """
+
+    def __init__(self, name, maxsize=256, ttl=300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = collections.OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def _record(self, stat):
+        self._stats[stat] += 1
+        metrics.count('cache_events_total', cache=self.name, event=_EVENTS[stat])
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        if not self.maxsize:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self._record('expired')
+                entry = None
+            if entry is None:
+                self._record('misses')
+                return None
+            self._entries.move_to_end(key)
+            self._record('hits')
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._record('evictions')
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for key, computing and caching it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns hit/miss/eviction counts, the hit ratio and the current size."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,269 @@
+import os
+import itertools
+import threading
+from flask import current_app
+
+# Declarative definitions of the Form 460 schedule sheets the XLSX extractors
+# understand. Each Schedule maps a sheet to a target table, and each output
+# column to the sheet columns it is read from, with ordered fallbacks and a type
+# coercion. The first time a sheet layout (its header) is seen, the schedule is
+# compiled into an extraction function that has already resolved which source
+# columns exist. The function is cached by header signature, so re-uploads of the
+# same layout skip all of that work.
+#
+# Adding a schedule means adding a Schedule here; the extraction loop doesn't change.
+#
+# The definitions are plain Python. numpy and pandas are imported inside the
+# columnar helpers below, on the first sheet actually extracted.
+
+class Field:
+    """
+    One output column of a schedule.
+
+    Args:
+        *sources: Sheet columns (lowercase) to read, in order of preference. Columns
+            missing from a sheet are skipped. For kind='name' each source is a
+            (first name column, last name column) pair.
+        kind (str): 'text' (as is), 'name' (joined like f"{first} {last}".strip()),
+            'amount' (float) or 'date' (str of the date, None if missing).
+        fallback (str): When a row falls through to the next source: 'missing'
+            (NaN/None) or 'empty' (any falsy value, e.g. '' or None but not NaN).
+        required (bool): Drop rows where the value is missing (or '' for text/names).
+    """
+
+    def __init__(self, *sources, kind='text', fallback='missing', required=False):
+        self.sources = sources
+        self.kind = kind
+        self.fallback = fallback
+        self.required = required
+
+    def __repr__(self):
+        return f"Field({', '.join(map(repr, self.sources))}, kind={self.kind!r}, fallback={self.fallback!r}, required={self.required!r})"
+
+class Schedule:
+    """
+    A schedule sheet and how its rows become records.
+
+    Args:
+        sheet_name (str): Worksheet name in the e-filing export.
+        table (str): Target table, 'contributions' or 'expenditures'.
+        fields (dict): Output column name -> Field, in record order. Every record
+            also gets source_file.
+        where (dict): Optional sheet column -> allowed values; other rows are skipped.
+    """
+
+    def __init__(self, sheet_name, table, fields, where=None):
+        self.sheet_name = sheet_name
+        self.table = table
+        self.fields = fields
+        self.where = where or {}
+        # Changes whenever the definition does; keys the compiled and sheet caches
+        self.signature = f"{sheet_name}|{table}|{fields!r}|{sorted(self.where.items())!r}"
+
+def _contributions(sheet_name):
+    return Schedule(sheet_name, 'contributions', {
+        "filer_name": Field('filer_naml'),
+        "contributor_name": Field(('tran_namf', 'tran_naml'), kind='name', required=True),
+        "contribution_amount": Field('tran_amt1', kind='amount', required=True),
+        "contribution_date": Field('tran_date', kind='date'),
+    })
+
+def _expenditures(sheet_name):
+    return Schedule(sheet_name, 'expenditures', {
+        "filer_name": Field('filer_naml'),
+        "payee_name": Field(('payee_namf', 'payee_naml'), kind='name', required=True),
+        # F-Expenses reports amt_paid and only has the report date
+        "expenditure_amount": Field('amount', 'amt_paid', kind='amount', required=True),
+        "expenditure_date": Field('expn_date', 'rpt_date', kind='date'),
+        # Like the original row loop, only falsy descriptions fall back ('' or None, but not NaN)
+        "expenditure_description": Field('expn_dscr', 'tran_dscr', fallback='empty'),
+    })
+
+SCHEDULES = {schedule.sheet_name: schedule for schedule in [
+    _contributions('A-Contributions'),
+    _contributions('C-Contributions'),
+    _contributions('I-Contributions'),
+    _contributions('F496P3-Contributions'),
+    _expenditures('F465P3-Expenditure'),
+    _expenditures('F461P5-Expenditure'),
+    _expenditures('D-Expenditure'),
+    _expenditures('G-Expenditure'),
+    _expenditures('E-Expenditure'),
+    _expenditures('F-Expenses'),
+]}
+
+# Schedules that are only extracted when listed in app.config['EXTRA_SCHEDULES'].
+# Late contributions (Form 497) are re-reported on the next Form 460's Schedule A,
+# so loading both would count them twice.
+OPTIONAL_SCHEDULES = {schedule.sheet_name: schedule for schedule in [
+    Schedule('497', 'contributions', {
+        "filer_name": Field('filer_naml'),
+        "contributor_name": Field(('enty_namf', 'enty_naml'), kind='name', required=True),
+        "contribution_amount": Field('amount', kind='amount', required=True),
+        "contribution_date": Field('ctrib_date', kind='date'),
+    }, where={'form_type': ['F497P1']}), # Part 1: contributions received
+]}
+
+def schedule_for(sheet_name):
+    """Returns the Schedule for a sheet, or None if the sheet isn't extracted."""
+    schedule = SCHEDULES.get(sheet_name)
+    if schedule is None and sheet_name in current_app.config.get('EXTRA_SCHEDULES', ()):
+        schedule = OPTIONAL_SCHEDULES.get(sheet_name)
+    return schedule
+
+# --- Columnar helpers ---
+
+def _column(df, name, default=''):
+    """
+    Returns a column as an object array, or a constant array when the column is
+    missing. This is the columnar equivalent of row.get(name, default).
+    """
+    import numpy as np
+    if name in df.columns:
+        return df[name].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
+
+def _join_names(first, last):
+    """
+    Vectorized f"{first} {last}".strip(). Values are stringified exactly like the
+    f-string did, so a missing first name still renders as 'nan'.
+    """
+    import numpy as np
+    return np.char.strip(np.char.add(np.char.add(first.astype(str), ' '), last.astype(str))).astype(object)
+
+def _coerce_amounts(amounts, keep, sheet_name, file_path):
+    """
+    Converts the kept amounts to float in one pass. Only values pandas can't parse
+    fall back to float(); rows float() rejects as well are dropped, as the row loop
+    did. Returns the float array and the updated keep mask.
+    """
+    import numpy as np
+    import pandas as pd
+    numeric = np.full(len(amounts), np.nan)
+    numeric[keep] = pd.to_numeric(amounts[keep], errors='coerce')
+    keep = keep.copy()
+    for position in np.flatnonzero(keep & np.isnan(numeric)):
+        try:
+            numeric[position] = float(amounts[position])
+        except Exception as e:
+            current_app.logger.error(f"Error processing row {position} in sheet '{sheet_name}' in {file_path}: {e}")
+            keep[position] = False
+    return numeric, keep
+
+def _format_dates(df, name):
+    """Vectorized str(date) for a column, with missing dates as None."""
+    import numpy as np
+    import pandas as pd
+    if name not in df.columns:
+        return np.full(len(df), None, dtype=object)
+    values = df[name].to_numpy()
+    if values.dtype.kind == 'M':
+        missing = np.isnat(values)
+        seconds = values.astype('datetime64[s]')
+        if not (seconds != values)[~missing].any():
+            # Without fractional seconds str(Timestamp) is 'YYYY-MM-DD HH:MM:SS'
+            formatted = np.char.replace(np.datetime_as_string(seconds), 'T', ' ').astype(object)
+            formatted[missing] = None
+            return formatted
+    missing = pd.isna(values)
+    formatted = np.array([str(value) for value in df[name].to_numpy(dtype=object)], dtype=object)
+    formatted[missing] = None
+    return formatted
+
+def _to_records(columns, keep):
+    """Zips the kept positions of each column array into per-row record dicts."""
+    import numpy as np
+    keys = list(columns)
+    values = [column[keep].tolist() if isinstance(column, np.ndarray) else itertools.repeat(column) for column in columns.values()]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+# --- Compilation ---
+
+def _source_reader(kind, source, columns):
+    """Returns a df -> array reader for one source, or None if the sheet lacks it."""
+    if kind == 'name':
+        first, last = source
+        if first not in columns and last not in columns:
+            return None
+        return lambda df: _join_names(_column(df, first), _column(df, last))
+    if source not in columns:
+        return None
+    if kind == 'date':
+        return lambda df: _format_dates(df, source)
+    return lambda df: df[source].to_numpy(dtype=object)
+
+def _field_reader(field, columns):
+    """Resolves a field's fallback chain against a header into a single df -> array reader."""
+    import numpy as np
+    import pandas as pd
+    readers = [reader for reader in (_source_reader(field.kind, source, columns) for source in field.sources) if reader]
+    default = None if field.kind in ('amount', 'date') else ''
+    if not readers:
+        return lambda df: np.full(len(df), default, dtype=object)
+    if len(readers) == 1:
+        return readers[0]
+
+    def read(df):
+        values = readers[0](df)
+        for reader in readers[1:]:
+            fall_through = pd.isna(values) if field.fallback == 'missing' else ~values.astype(bool)
+            if fall_through.any():
+                values = np.where(fall_through, reader(df), values)
+        return values
+    return read
+
+def compile_schedule(schedule, columns):
+    """
+    Compiles a schedule for one sheet header into a function
+    (df, sheet_name, file_path) -> records.
+    """
+    import numpy as np
+    import pandas as pd
+    columns = set(columns)
+    readers = [(name, field, _field_reader(field, columns)) for name, field in schedule.fields.items()]
+    filters = [(column, list(values)) for column, values in schedule.where.items()]
+    if any(column not in columns for column, _ in filters):
+        return lambda df, sheet_name, file_path: [] # No row can match
+
+    def extract(df, sheet_name, file_path):
+        if df.empty:
+            return []
+        keep = np.ones(len(df), dtype=bool)
+        for column, values in filters:
+            keep &= np.isin(df[column].to_numpy(dtype=object), values)
+        output = {}
+        for name, field, read in readers:
+            values = read(df)
+            if field.required:
+                keep &= pd.notna(values)
+                if field.kind in ('text', 'name'):
+                    keep &= values != ''
+            output[name] = values
+        for name, field, _ in readers:
+            if field.kind != 'amount':
+                continue
+            if field.required:
+                output[name], keep = _coerce_amounts(output[name], keep, sheet_name, file_path)
+            else:
+                present = keep & pd.notna(output[name])
+                numeric, parsed = _coerce_amounts(output[name], present, sheet_name, file_path)
+                keep &= ~(present & ~parsed)
+                output[name] = np.where(np.isnan(numeric), None, numeric)
+        output["source_file"] = os.path.basename(file_path)
+        return _to_records(output, keep)
+    return extract
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+def extractor_for(schedule, columns):
+    """Returns the compiled extractor for a schedule and sheet header, compiling it on first sight."""
+    key = (schedule.signature, tuple(columns))
+    extract = _compiled.get(key)
+    if extract is None:
+        extract = compile_schedule(schedule, columns)
+        with _compiled_lock:
+            if len(_compiled) >= 1024: # Layouts are few; this only guards against unbounded growth
+                _compiled.clear()
+            _compiled[key] = extract
+    return extract
@@ -0,0 +1,24 @@
+import pickle
+
+# Record batches are spooled to disk between extraction and loading. A file is
+# extracted (which for scanned PDFs means minutes of OCR) without holding the
+# database write lock, and insert_batches then holds it only for as long as it
+# takes to read the batches back and write them. One batch is in memory at a time.
+
+def write_spool(batches, spool_path):
+    """Pickles each record batch to spool_path as it is produced. Returns the number of records written."""
+    rows = 0
+    with open(spool_path, 'wb') as spool:
+        for batch in batches:
+            rows += len(batch.get('contributions') or []) + len(batch.get('expenditures') or [])
+            pickle.dump(batch, spool, protocol=pickle.HIGHEST_PROTOCOL)
+    return rows
+
+def read_spool(spool_path):
+    """Yields the batches written by write_spool, in order."""
+    with open(spool_path, 'rb') as spool:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# The modules under test import each other as top-level modules, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def app(tmp_path):
+    """A bare Flask app, in context, with its caches in a scratch directory."""
+    app = Flask(__name__)
+    app.config['SHEET_CACHE_DIR'] = str(tmp_path / 'sheet_cache')
+    app.config['OCR_CACHE_DIR'] = str(tmp_path / 'ocr_cache')
+    with app.app_context():
+        yield app
@@ -0,0 +1,72 @@
+import pdf_parser
+
+COVER = "COVER PAGE\nNAME OF FILER\nFriends of Ana Lopez\n"
+
+def parse(pages):
+    contributions, expenditures = pdf_parser.parse_pages(pages, '/uploads/filing.pdf')
+    return contributions, expenditures
+
+def names(records, field='contributor_name'):
+    return [record[field] for record in records]
+
+def test_schedule_header_split_across_pages():
+    contributions, _ = parse([COVER + "SCHEDU", "LE A\nJane Doe 1/2/24\n10.00\n"])
+    assert contributions == [{
+        'filer_name': 'Friends of Ana Lopez', 'contribution_amount': 10.0, 'contributor_name': 'Jane Doe 1/2/24',
+        'expenditure_description': '', 'contribution_date': '1/2/24', 'source_file': 'filing.pdf', 'page': 2, 'line': 2,
+    }]
+
+def test_filer_header_split_across_pages():
+    contributions, _ = parse(["COVER PAGE\nNAME OF ", "FILER\nFriends of Ana Lopez\nSCHEDULE A\nJane Doe\n10.00\n"])
+    assert [record['filer_name'] for record in contributions] == ['Friends of Ana Lopez']
+
+def test_page_ending_without_newline_runs_into_the_next():
+    contributions, _ = parse([COVER + "SCHEDULE A\nJane", "Doe 1/2/24\n10.00\n"])
+    assert names(contributions) == ['JaneDoe 1/2/24']
+    assert (contributions[0]['page'], contributions[0]['line']) == (1, 5)
+
+def test_pages_without_any_newline_are_carried_over():
+    # A blank page (e.g. failed OCR) and a scrap of a line split across pages
+    contributions, _ = parse([COVER + "SCHEDULE A\nJane", "", "Doe 1/2/24\n10.00\n"])
+    assert names(contributions) == ['JaneDoe 1/2/24']
+    contributions, _ = parse([COVER + "SCHEDULE A\nJane", "Doe", "x\n10.00"])
+    assert names(contributions) == ['JaneDoex']
+    assert (contributions[0]['page'], contributions[0]['line']) == (1, 5)
+
+def test_line_starting_on_a_page_without_newline():
+    contributions, _ = parse([COVER + "SCHEDULE A\n", "Ja", "ne Doe\n10.00\n"])
+    assert names(contributions) == ['Jane Doe']
+    assert (contributions[0]['page'], contributions[0]['line']) == (2, 1)
+
+def test_switches_between_schedules():
+    pages = [
+        COVER + "SCHEDULE A\nJane Doe\n1/2/24\n$1,250.00\n",
+        "SCHEDULE E\nDesert Sun Printing\nYard signs 75.00\n",
+        "SUMMARY PAGE\nTotal 1,325.00\nSCHEDULE C\nJose Ramos 3/4/24\nCatering 40.00\n",
+    ]
+    contributions, expenditures = parse(pages)
+    assert [(record['contributor_name'], record['contribution_amount'], record.get('contribution_date'))
+        for record in contributions] == [('Jane Doe', 1250.0, '1/2/24'), ('Jose Ramos 3/4/24', 40.0, '3/4/24')]
+    assert [(record['payee_name'], record['expenditure_amount'], record['expenditure_description'])
+        for record in expenditures] == [('Desert Sun Printing', 75.0, 'Yard signs')]
+
+def test_records_carry_the_page_and_line_they_start_on():
+    pages = [
+        COVER + "SCHEDULE A\nJane Doe\n10.00\n\nJose Ramos\n",
+        "123 Main St\n20.00\n\nMaria Garcia\n30.00\n",
+    ]
+    contributions, _ = parse(pages)
+    assert [(record['contributor_name'], record['page'], record['line']) for record in contributions] == [
+        ('Jane Doe', 1, 5), ('Jose Ramos', 1, 8), ('Maria Garcia', 2, 4)]
+
+def test_records_before_the_cover_page_get_the_filer_name():
+    parser = pdf_parser.RecordParser('filing.pdf')
+    early = parser.feed(1, "SCHEDULE A\nJane Doe\n10.00\n")
+    assert early == {'contributions': [], 'expenditures': []} # Held until the filer is known
+    later = parser.feed(2, COVER)
+    assert [record['filer_name'] for record in later['contributions']] == ['Friends of Ana Lopez']
+    assert parser.close() == {'contributions': [], 'expenditures': []}
+
+def test_unknown_filer():
+    contributions, _ = parse(["SCHEDULE A\nJane Doe\n10.00"])
+    assert [record['filer_name'] for record in contributions] == [pdf_parser.UNKNOWN_FILER]
@@ -0,0 +1,53 @@
+import datetime
+import os
+
+import openpyxl
+
+import data_extractor
+
+HEADER = ['Filer_NamL', 'Payee_NamF', 'Payee_NamL', 'Amount', 'Expn_Date', 'Expn_Dscr']
+ROWS = [
+    ['Friends of Ana Lopez', 'Maria', 'Garcia', 120.5, datetime.datetime(2024, 3, 1), 'Yard signs'],
+    # A date typed into the description column
+    ['Friends of Ana Lopez', '', 'Desert Sun Printing', 80.0, datetime.datetime(2024, 3, 2), datetime.datetime(2024, 3, 2)],
+    ['Friends of Ana Lopez', 'Jose', 'Ramos', 45.0, datetime.datetime(2024, 3, 3), 'Postage'],
+]
+
+def write_workbook(path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'E-Expenditure'
+    sheet.append(HEADER)
+    for row in ROWS:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+def extract(path):
+    batches = list(data_extractor.stream_data_from_xlsx(path, batch_size=2))
+    return [record for batch in batches for record in batch['expenditures']]
+
+def cache_entries(cache_dir):
+    return [name for _, _, names in os.walk(cache_dir) for name in names]
+
+def test_cached_records_match_uncached(app, tmp_path):
+    path = write_workbook(tmp_path / 'filing.xlsx')
+    cache_dir = app.config['SHEET_CACHE_DIR']
+    app.config['SHEET_CACHE_DIR'] = None
+    uncached = extract(path)
+    assert [record['expenditure_description'] for record in uncached] == \
+        ['Yard signs', datetime.datetime(2024, 3, 2), 'Postage']
+
+    app.config['SHEET_CACHE_DIR'] = cache_dir
+    assert extract(path) == uncached # Extracted, and written to the cache
+    assert len(cache_entries(cache_dir)) == 1
+    assert extract(path) == uncached # Read back from the cache
+
+def test_unwritable_cache_still_extracts(app, tmp_path):
+    path = write_workbook(tmp_path / 'filing.xlsx')
+    blocker = tmp_path / 'not_a_directory'
+    blocker.write_text('')
+    app.config['SHEET_CACHE_DIR'] = str(blocker)
+    cached = extract(path)
+    app.config['SHEET_CACHE_DIR'] = None
+    assert cached == extract(path)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import hashlib
+import tempfile
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 1024 * 1024
+
+def blob_path(store_dir, sha256):
+    return os.path.join(store_dir, sha256[:2], sha256)
+
+def save_upload(file_storage, store_dir):
+    """
+    Streams an uploaded file into the content-addressed store, hashing it on the
+    way. Identical uploads are stored once.
+
+    Args:
+        file_storage: The werkzeug FileStorage from request.files.
+        store_dir (str): Root of the content-addressed store.
+
+    Returns:
+        tuple: (sha256 hex digest, path of the stored blob)
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                tmp.write(chunk)
+        sha256 = digest.hexdigest()
+        path = blob_path(store_dir, sha256)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, path
+
+def file_sha256(path):
+    """Returns the SHA-256 hex digest of a file on disk, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_upload(path, directory, filename):
+    """
+    Exposes a stored blob under its client filename, which the extractors record
+    as source_file. Hard links cost nothing; falls back to a copy across devices.
+
+    The filename comes from the client, so only a sanitized base name is used
+    ('../../x.xlsx' becomes 'x.xlsx'). Names with nothing safe left but the
+    extension (e.g. all non-ASCII) use the blob's hash instead.
+    """
+    os.makedirs(directory, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower()
+    extension = extension if extension[1:].isalnum() else ''
+    name = secure_filename(filename)
+    if not name.lower().endswith(extension) or len(name) <= len(extension):
+        name = os.path.basename(path) + extension
+    target = os.path.join(directory, name)
+    if os.path.lexists(target):
+        os.remove(target) # A later file of the same name in one upload wins, as with file.save()
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copyfile(path, target)
+    return target